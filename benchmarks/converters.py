@@ -0,0 +1,549 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+"""Throughput and memory of the doc converters.
+
+Runs every DocConverterBase subclass in both directions on synthetic ERPNext
+and Books payloads of realistic sizes, against an in-process stand-in for the
+parts of frappe the converters use. Runs without a bench:
+
+    python benchmarks/converters.py [--docs 200] [--repeat 3] [--filter Sales]
+
+Reports documents per second, the peak traced memory and the memory blocks
+allocated per converted document, and the database lookups the converters
+made per document (memoised for the run, as in a processing job).
+"""
+
+import argparse
+import datetime
+import json
+import os
+import random
+import sys
+import time
+import tracemalloc
+import types
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+INSTANCE = "pos-01"
+
+
+class FakeDB:
+    """Answers the lookups of the converters with plausible values."""
+
+    def __init__(self):
+        self.queries = 0
+
+    def get_value(self, doctype, filters=None, fieldname="name", as_dict=False):
+        self.queries += 1
+        if doctype == "Books Instance":
+            return "POS-01"
+
+        if isinstance(fieldname, (list, tuple)):
+            values = {field: f"{doctype}-{field}" for field in fieldname}
+            if doctype == "Sales Invoice Item":
+                values["amount"] = 100.0
+            if as_dict:
+                return _dict(values)
+            return tuple(values.values())
+
+        if isinstance(filters, dict):
+            return f"ERP-{filters.get('books_name')}"
+
+        return f"{doctype}-{fieldname}"
+
+    def exists(self, doctype, name=None):
+        self.queries += 1
+        return name if name and "Customer" in name else None
+
+
+class _dict(dict):
+    __getattr__ = dict.get
+
+
+def install_fake_frappe():
+    frappe = types.ModuleType("frappe")
+    frappe._dict = _dict
+    frappe.local = types.SimpleNamespace()
+    frappe.session = _dict(user="Administrator")
+    frappe.db = FakeDB()
+    frappe.as_json = lambda obj, indent=1, **kwargs: json.dumps(
+        obj, indent=indent, sort_keys=True, default=str
+    )
+
+    settings = _dict(
+        sync_item_as_non_inventory=0,
+        tax_mapping=[
+            {"erpn_tax_template": "GST 18% - WS", "books_tax_template": "GST 18%"},
+            {"erpn_tax_template": "GST 5% - WS", "books_tax_template": "GST 5%"},
+        ],
+    )
+    frappe.get_cached_doc = lambda *args: settings
+    frappe.get_doc = lambda doc, *args, **kwargs: _dict(doc if isinstance(doc, dict) else {})
+
+    def throw(message, *args, **kwargs):
+        raise Exception(message)
+
+    frappe.throw = throw
+
+    model = types.ModuleType("frappe.model")
+    document = types.ModuleType("frappe.model.document")
+    document.Document = type("Document", (), {})
+    utils = types.ModuleType("frappe.utils")
+    utils.flt = lambda value, precision=None: float(value or 0)
+    utils.cint = lambda value: int(value or 0)
+    utils.getdate = lambda value: datetime.date.fromisoformat(str(value)[:10])
+    utils.now = lambda: datetime.datetime.now().isoformat(sep=" ")
+
+    frappe.model = model
+    frappe.utils = utils
+    model.document = document
+    sys.modules.update(
+        {
+            "frappe": frappe,
+            "frappe.model": model,
+            "frappe.model.document": document,
+            "frappe.utils": utils,
+        }
+    )
+    return frappe
+
+
+def books_item(index, conversions=3):
+    return {
+        "doctype": "Item",
+        "name": f"ITEM-{index:05d}",
+        "unit": "Nos",
+        "rate": round(random.uniform(10, 2000), 2),
+        "description": "Synthetic item description",
+        "hsnCode": "84713010",
+        "trackItem": 1,
+        "hasBatch": 0,
+        "hasSerialNumber": 0,
+        "tax": "GST 18%",
+        "barcode": f"890{index:010d}",
+        "uomConversions": [
+            {"uom": f"UOM-{row}", "conversionFactor": row + 1}
+            for row in range(conversions)
+        ],
+    }
+
+
+def erpn_item(index, conversions=3):
+    return {
+        "doctype": "Item",
+        "item_code": f"ITEM-{index:05d}",
+        "stock_uom": "Nos",
+        "standard_rate": round(random.uniform(10, 2000), 2),
+        "description": "Synthetic item description",
+        "gst_hsn_code": "84713010",
+        "is_stock_item": 1,
+        "has_batch_no": 0,
+        "has_serial_no": 0,
+        "image": None,
+        "taxes": [{"item_tax_template": "GST 18% - WS"}],
+        "uoms": [
+            {"uom": f"UOM-{row}", "conversion_factor": row + 1}
+            for row in range(conversions)
+        ],
+    }
+
+
+def books_invoice(index, items=10):
+    return {
+        "doctype": "SalesInvoice",
+        "name": f"SINV-{index:06d}",
+        "party": f"Customer {random.randint(1, 300)}",
+        "date": "2024-12-26T10:15:00.000Z",
+        "isReturn": False,
+        "returnAgainst": None,
+        "priceList": "Standard Selling",
+        "netTotal": round(random.uniform(100, 50000), 2),
+        "baseGrandTotal": round(random.uniform(100, 50000), 2),
+        "grandTotal": round(random.uniform(100, 50000), 2),
+        "currency": "INR",
+        "exchangeRate": 1,
+        "outstandingAmount": 0,
+        "terms": None,
+        "submitted": True,
+        "cancelled": False,
+        "items": [
+            {
+                "item": f"ITEM-{random.randint(1, 5000):05d}",
+                "description": "Synthetic item description",
+                "quantity": random.randint(1, 10),
+                "unit": "Nos",
+                "unitConversionFactor": 1,
+                "rate": round(random.uniform(10, 2000), 2),
+                "amount": round(random.uniform(10, 20000), 2),
+                "itemDiscountPercent": random.choice((0, 0, 5, 10)),
+                "itemDiscountAmount": 0,
+                "batch": None,
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def erpn_invoice(index, items=10):
+    return {
+        "doctype": "Sales Invoice",
+        "name": f"ACC-SINV-{index:06d}",
+        "customer": f"Customer {random.randint(1, 300)}",
+        "posting_date": "2024-12-26",
+        "is_return": 0,
+        "return_against": None,
+        "selling_price_list": "Standard Selling",
+        "net_total": round(random.uniform(100, 50000), 2),
+        "base_grand_total": round(random.uniform(100, 50000), 2),
+        "grand_total": round(random.uniform(100, 50000), 2),
+        "currency": "INR",
+        "conversion_rate": 1,
+        "outstanding_amount": 0,
+        "terms": None,
+        "docstatus": 1,
+        "items": [
+            {
+                "item_code": f"ITEM-{random.randint(1, 5000):05d}",
+                "description": "Synthetic item description",
+                "qty": random.randint(1, 10),
+                "stock_uom": "Nos",
+                "batch_no": None,
+                "conversion_factor": 1,
+                "discount_percentage": 0,
+                "discount_amount": 0,
+                "price_list_rate": round(random.uniform(10, 2000), 2),
+                "amount": round(random.uniform(10, 20000), 2),
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def books_payment(index, references=3):
+    return {
+        "doctype": "Payment",
+        "name": f"PAY-{index:06d}",
+        "date": "2024-12-26T10:15:00.000Z",
+        "paymentType": "Receive",
+        "paymentMethod": random.choice(("Cash", "Transfer")),
+        "party": f"Customer {random.randint(1, 300)}",
+        "amount": round(random.uniform(100, 50000), 2),
+        "paymentAccount": "Cash",
+        "for": [
+            {
+                "referenceName": f"SINV-{random.randint(1, 999999):06d}",
+                "referenceType": "SalesInvoice",
+                "amount": round(random.uniform(100, 5000), 2),
+            }
+            for _ in range(references)
+        ],
+    }
+
+
+def erpn_payment(index, references=3):
+    return {
+        "doctype": "Payment Entry",
+        "name": f"ACC-PAY-{index:06d}",
+        "posting_date": "2024-12-26",
+        "payment_type": "Receive",
+        "mode_of_payment": "Cash",
+        "party": f"Customer {random.randint(1, 300)}",
+        "total_allocated_amount": round(random.uniform(100, 50000), 2),
+        "paid_to": "Cash - WS",
+        "references": [
+            {
+                "reference_name": f"ACC-SINV-{random.randint(1, 999999):06d}",
+                "reference_doctype": "Sales Invoice",
+                "total_amount": round(random.uniform(100, 5000), 2),
+            }
+            for _ in range(references)
+        ],
+    }
+
+
+def books_stock_movement(index, items=10):
+    return {
+        "doctype": "StockMovement",
+        "name": f"SMOV-{index:06d}",
+        "movementType": "MaterialTransfer",
+        "date": "2024-12-26T10:15:00.000Z",
+        "amount": round(random.uniform(100, 50000), 2),
+        "items": [
+            {
+                "fromLocation": "Stores",
+                "toLocation": "Shop",
+                "item": f"ITEM-{random.randint(1, 5000):05d}",
+                "quantity": random.randint(1, 10),
+                "transferQuantity": random.randint(1, 10),
+                "transferUnit": "Nos",
+                "unit": "Nos",
+                "unitConversionFactor": 1,
+                "rate": round(random.uniform(10, 2000), 2),
+                "amount": round(random.uniform(10, 20000), 2),
+                "serialNumber": None,
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def erpn_stock_entry(index, items=10):
+    return {
+        "doctype": "Stock Entry",
+        "name": f"MAT-STE-{index:06d}",
+        "stock_entry_type": "Material Transfer",
+        "posting_date": "2024-12-26",
+        "total_amount": round(random.uniform(100, 50000), 2),
+        "docstatus": 1,
+        "items": [
+            {
+                "s_warehouse": "Stores - WS",
+                "t_warehouse": "Shop - WS",
+                "item_code": f"ITEM-{random.randint(1, 5000):05d}",
+                "qty": random.randint(1, 10),
+                "transfer_qty": random.randint(1, 10),
+                "uom": "Nos",
+                "stock_uom": "Nos",
+                "conversion_factor": 1,
+                "basic_rate": round(random.uniform(10, 2000), 2),
+                "amount": round(random.uniform(10, 20000), 2),
+                "serial_no": None,
+                "use_serial_batch_fields": 1,
+                "serial_and_batch_bundle": None,
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def books_shipment(index, items=10):
+    return {
+        "doctype": "Shipment",
+        "name": f"SHP-{index:06d}",
+        "party": f"Customer {random.randint(1, 300)}",
+        "date": "2024-12-26T10:15:00.000Z",
+        "grandTotal": round(random.uniform(100, 50000), 2),
+        "backReference": f"SINV-{index:06d}",
+        "items": [
+            {
+                "item": f"ITEM-{random.randint(1, 5000):05d}",
+                "quantity": random.randint(1, 10),
+                "unit": "Nos",
+                "rate": round(random.uniform(10, 2000), 2),
+                "location": "Stores",
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def erpn_delivery_note(index, items=10):
+    return {
+        "doctype": "Delivery Note",
+        "name": f"MAT-DN-{index:06d}",
+        "customer": f"Customer {random.randint(1, 300)}",
+        "posting_date": "2024-12-26",
+        "grand_total": round(random.uniform(100, 50000), 2),
+        "items": [
+            {
+                "item_code": f"ITEM-{random.randint(1, 5000):05d}",
+                "qty": random.randint(1, 10),
+                "uom": "Nos",
+                "rate": round(random.uniform(10, 2000), 2),
+                "warehouse": "Stores - WS",
+            }
+            for _ in range(items)
+        ],
+    }
+
+
+def books_price_list(index, items=20):
+    return {
+        "doctype": "PriceList",
+        "name": f"Price List {index}",
+        "isEnabled": 1,
+        "isPurchase": 0,
+        "isSelling": 1,
+        "priceListItem": [
+            {
+                "name": f"PLI-{index}-{row}",
+                "item": f"ITEM-{row:05d}",
+                "unit": "Nos",
+                "parent": f"Price List {index}",
+                "rate": round(random.uniform(10, 2000), 2),
+            }
+            for row in range(items)
+        ],
+    }
+
+
+def simple_cases():
+    """(label, target, factory) of the converters without child tables."""
+    address = {"city": "Kochi", "state": "Kerala", "country": "India"}
+    return [
+        ("Customer", "erpn", lambda i: {
+            "doctype": "Customer", "name": f"Customer {i}", "gstin": None,
+            "gstType": "Unregistered", "address": f"ADDR-{i}",
+        }),
+        ("Customer", "fbooks", lambda i: {
+            "doctype": "Customer", "name": f"Customer {i}", "gstin": None,
+            "gst_category": "Unregistered",
+            "customer_primary_address": f"Customer {i}-Billing",
+        }),
+        ("Supplier", "erpn", lambda i: {
+            "doctype": "Supplier", "name": f"Supplier {i}", "gstin": None,
+            "gstType": "Unregistered", "address": f"ADDR-{i}",
+        }),
+        ("Supplier", "fbooks", lambda i: {
+            "doctype": "Supplier", "name": f"Supplier {i}", "gstin": None,
+            "gst_category": "Unregistered",
+            "supplier_primary_address": f"Supplier {i}-Billing",
+        }),
+        ("PriceListItem", "erpn", lambda i: {
+            "doctype": "PriceListItem", "name": f"PLI-{i}", "item": f"ITEM-{i:05d}",
+            "unit": "Nos", "parent": "Standard Selling", "rate": 120.0,
+        }),
+        ("Item Price", "fbooks", lambda i: {
+            "doctype": "Item Price", "name": f"IP-{i}", "item_code": f"ITEM-{i:05d}",
+            "uom": "Nos", "price_list": "Standard Selling", "price_list_rate": 120.0,
+        }),
+        ("SerialNumber", "erpn", lambda i: {
+            "doctype": "SerialNumber", "name": f"SN-{i:08d}", "item": "ITEM-00001",
+            "description": "Synthetic serial",
+        }),
+        ("Serial No", "fbooks", lambda i: {
+            "doctype": "Serial No", "serial_no": f"SN-{i:08d}",
+            "item_code": "ITEM-00001", "description": "Synthetic serial",
+        }),
+        ("Batch", "erpn", lambda i: {
+            "doctype": "Batch", "name": f"B-{i:06d}", "expiryDate": "2026-12-31",
+            "manufactureDate": "2024-12-01",
+        }),
+        ("Batch", "fbooks", lambda i: {
+            "doctype": "Batch", "batch_id": f"B-{i:06d}", "expiry_date": "2026-12-31",
+            "manufacturing_date": "2024-12-01",
+        }),
+        ("UOM", "erpn", lambda i: {"doctype": "UOM", "name": f"UOM-{i}", "isWhole": 1}),
+        ("UOM", "fbooks", lambda i: {
+            "doctype": "UOM", "name": f"UOM-{i}", "uom_name": f"UOM-{i}",
+            "must_be_whole_number": 1,
+        }),
+        ("UOMConversionItem", "erpn", lambda i: {
+            "doctype": "UOMConversionItem", "uom": f"UOM-{i}", "conversionFactor": 12,
+        }),
+        ("UOM Conversion Detail", "fbooks", lambda i: {
+            "doctype": "UOM Conversion Detail", "uom": f"UOM-{i}",
+            "conversion_factor": 12,
+        }),
+        ("Address", "erpn", lambda i: {
+            "doctype": "Address", "name": f"ADDR-{i}", "addressLine1": "12 Market Road",
+            "addressLine2": None, "postalCode": "682001", **address,
+        }),
+        ("Address", "fbooks", lambda i: {
+            "doctype": "Address", "name": f"ADDR-{i}", "address_line1": "12 Market Road",
+            "address_line2": None, "pincode": "682001", **address,
+        }),
+    ]
+
+
+def get_cases():
+    """(label, target, factory) of every benchmarked payload."""
+    cases = []
+    for n in (1, 20, 100):
+        cases.append((f"Item [{n} uoms]", "erpn", partial(books_item, conversions=n)))
+        cases.append((f"Item [{n} uoms]", "fbooks", partial(erpn_item, conversions=n)))
+
+    for n in (1, 10, 100, 500):
+        cases.append((f"SalesInvoice [{n} items]", "erpn", partial(books_invoice, items=n)))
+        cases.append((f"Sales Invoice [{n} items]", "fbooks", partial(erpn_invoice, items=n)))
+
+    for n in (1, 50):
+        cases.append((f"StockMovement [{n} items]", "erpn", partial(books_stock_movement, items=n)))
+        cases.append((f"Stock Entry [{n} items]", "fbooks", partial(erpn_stock_entry, items=n)))
+        cases.append((f"Shipment [{n} items]", "erpn", partial(books_shipment, items=n)))
+        cases.append((f"Delivery Note [{n} items]", "fbooks", partial(erpn_delivery_note, items=n)))
+
+    cases.append(("Payment [3 refs]", "erpn", books_payment))
+    cases.append(("Payment Entry [3 refs]", "fbooks", erpn_payment))
+    cases.append(("PriceList [20 items]", "erpn", books_price_list))
+    cases.append(("Price List", "fbooks", lambda i: {
+        "doctype": "Price List", "name": f"Price List {i}",
+        "price_list_name": f"Price List {i}", "enabled": 1, "buying": 0, "selling": 1,
+    }))
+    cases.extend(simple_cases())
+    return cases
+
+
+def convert_all(init_doc_converter, payloads, target):
+    return [
+        init_doc_converter(INSTANCE, payload, target).get_converted_doc()
+        for payload in payloads
+    ]
+
+
+def measure(frappe, init_doc_converter, payloads, target, repeat):
+    best = None
+    for _ in range(repeat):
+        frappe.local.books_memo = {}
+        start = time.perf_counter()
+        convert_all(init_doc_converter, payloads, target)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    frappe.local.books_memo = {}
+    frappe.db.queries = 0
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    tracemalloc.reset_peak()
+    # the converted docs are kept so that their memory counts in
+    converted = convert_all(init_doc_converter, payloads, target)
+    _, peak = tracemalloc.get_traced_memory()
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    del converted
+
+    blocks = sum(
+        max(stat.count_diff, 0) for stat in after.compare_to(before, "filename")
+    )
+    return {
+        "docs_per_sec": len(payloads) / best,
+        "peak_kib_per_doc": peak / 1024 / len(payloads),
+        "blocks_per_doc": blocks / len(payloads),
+        "queries_per_doc": frappe.db.queries / len(payloads),
+    }
+
+
+def run(docs, repeat, name_filter=None):
+    frappe = install_fake_frappe()
+    from books_integration.doc_converter import init_doc_converter
+
+    random.seed(42)
+    print(f"{docs} documents per case, best of {repeat} runs\n")
+    print(
+        f"{'case':<32}{'target':>8}{'docs/s':>12}{'peak KiB/doc':>14}"
+        f"{'blocks/doc':>12}{'queries/doc':>13}"
+    )
+
+    for label, target, factory in get_cases():
+        if name_filter and name_filter.lower() not in label.lower():
+            continue
+
+        payloads = [factory(index) for index in range(docs)]
+        result = measure(frappe, init_doc_converter, payloads, target, repeat)
+        print(
+            f"{label:<32}{target:>8}{result['docs_per_sec']:>12,.0f}"
+            f"{result['peak_kib_per_doc']:>14.2f}{result['blocks_per_doc']:>12.1f}"
+            f"{result['queries_per_doc']:>13.2f}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--docs", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--filter", help="only run cases whose label contains this")
+    args = parser.parse_args()
+    run(args.docs, args.repeat, args.filter)
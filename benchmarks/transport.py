@@ -0,0 +1,158 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+"""Payload size and parse time of the sync endpoint encodings.
+
+Compares plain JSON (what frappe sends by default) with the gzip and msgpack
+encodings negotiated by books_integration.api.transport on synthetic
+sync_transactions and get_pending_docs payloads. Runs without a bench:
+
+    python benchmarks/transport.py [--records 1000] [--repeat 5]
+"""
+
+import argparse
+import gzip
+import json
+import random
+import time
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def make_invoice(index):
+    items = []
+    for row in range(random.randint(1, 12)):
+        items.append(
+            {
+                "item": f"ITEM-{random.randint(1, 5000):05d}",
+                "description": "Synthetic item description",
+                "quantity": random.randint(1, 10),
+                "unit": "Nos",
+                "unitConversionFactor": 1,
+                "rate": round(random.uniform(10, 2000), 2),
+                "amount": round(random.uniform(10, 20000), 2),
+                "itemDiscountPercent": 0,
+                "itemDiscountAmount": 0,
+                "batch": None,
+            }
+        )
+
+    return {
+        "doctype": "SalesInvoice",
+        "name": f"SINV-{index:06d}",
+        "party": f"Customer {random.randint(1, 300)}",
+        "date": "2024-12-26T10:15:00.000Z",
+        "isReturn": False,
+        "returnAgainst": None,
+        "priceList": "Standard Selling",
+        "netTotal": round(random.uniform(100, 50000), 2),
+        "baseGrandTotal": round(random.uniform(100, 50000), 2),
+        "grandTotal": round(random.uniform(100, 50000), 2),
+        "currency": "INR",
+        "exchangeRate": 1,
+        "outstandingAmount": 0,
+        "terms": None,
+        "submitted": True,
+        "cancelled": False,
+        "items": items,
+    }
+
+
+def make_item(index):
+    return {
+        "doctype": "Item",
+        "name": f"ITEM-{index:05d}",
+        "unit": "Nos",
+        "rate": round(random.uniform(10, 2000), 2),
+        "description": "Synthetic item description",
+        "hsnCode": "84713010",
+        "trackItem": 1,
+        "hasBatch": 0,
+        "hasSerialNumber": 0,
+        "tax": "GST 18%",
+        "uomConversions": [
+            {"uom": uom, "conversionFactor": factor}
+            for uom, factor in (("Nos", 1), ("Box", 12), ("Carton", 144))
+        ],
+        "fbooksDocName": f"ITEM-{index:05d}",
+        "books_sync_id": f"{random.getrandbits(40):010x}",
+    }
+
+
+def get_encodings():
+    encodings = {
+        "json": (
+            lambda data: json.dumps(data, separators=(",", ":")).encode(),
+            json.loads,
+        ),
+        "json+gzip": (
+            lambda data: gzip.compress(
+                json.dumps(data, separators=(",", ":")).encode(), 6
+            ),
+            lambda body: json.loads(gzip.decompress(body)),
+        ),
+    }
+
+    if msgpack:
+        encodings["msgpack"] = (msgpack.packb, msgpack.unpackb)
+        encodings["msgpack+gzip"] = (
+            lambda data: gzip.compress(msgpack.packb(data), 6),
+            lambda body: msgpack.unpackb(gzip.decompress(body)),
+        )
+
+    return encodings
+
+
+def measure(payload, encode, decode, repeat):
+    encode_time = decode_time = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        body = encode(payload)
+        encode_time += time.perf_counter() - start
+
+        start = time.perf_counter()
+        decode(body)
+        decode_time += time.perf_counter() - start
+
+    return len(body), encode_time / repeat * 1000, decode_time / repeat * 1000
+
+
+def run(records, repeat):
+    random.seed(42)
+    payloads = {
+        "sync_transactions": {
+            "instance": "pos-01",
+            "records": [make_invoice(i) for i in range(records)],
+        },
+        "get_pending_docs": {
+            "message": {"success": True, "data": [make_item(i) for i in range(records)]}
+        },
+    }
+
+    encodings = get_encodings()
+    for name, payload in payloads.items():
+        print(f"\n{name} ({records} records)")
+        print(f"{'encoding':<14}{'bytes':>12}{'ratio':>8}{'encode ms':>12}{'parse ms':>11}")
+
+        baseline = None
+        for encoding, (encode, decode) in encodings.items():
+            size, encode_ms, decode_ms = measure(payload, encode, decode, repeat)
+            baseline = baseline or size
+            print(
+                f"{encoding:<14}{size:>12,}{size / baseline:>8.2f}"
+                f"{encode_ms:>12.2f}{decode_ms:>11.2f}"
+            )
+
+    if not msgpack:
+        print("\nmsgpack is not installed, msgpack encodings were skipped")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--records", type=int, default=1000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    run(args.records, args.repeat)
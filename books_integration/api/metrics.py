@@ -0,0 +1,175 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.query_builder.functions import Count, Min, Sum
+from frappe.utils import add_to_date, flt, now_datetime
+from werkzeug.wrappers import Response
+
+
+METRICS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+METRICS_CACHE_KEY = "books_integration_metrics"
+METRICS_CACHE_SECONDS = 15
+THROUGHPUT_WINDOW_MINUTES = 5
+
+
+@frappe.whitelist(methods=["GET"])
+def get_metrics():
+    """Returns the sync backlog and lag per Books Instance as Prometheus text."""
+    frappe.only_for("System Manager")
+
+    body = frappe.cache().get_value(METRICS_CACHE_KEY)
+    if not body:
+        body = format_metrics(collect_metrics())
+        frappe.cache().set_value(
+            METRICS_CACHE_KEY, body, expires_in_sec=METRICS_CACHE_SECONDS
+        )
+
+    return Response(body, content_type=METRICS_CONTENT_TYPE)
+
+
+def collect_metrics():
+    """Returns (name, type, help, samples) of every metric."""
+    instances = frappe.get_all("Books Instance", pluck="name")
+    now = now_datetime()
+
+    queue = get_queue_stats()
+    logs = get_unprocessed_log_stats()
+    processed = get_processed_record_counts(now)
+
+    def per_instance(values):
+        return [
+            ({"instance": instance}, values.get(instance, 0))
+            for instance in instances
+        ]
+
+    return [
+        (
+            "books_sync_queue_depth",
+            "gauge",
+            "Documents waiting in the Books Sync Queue to be pulled by Books.",
+            per_instance({row.instance: row.depth for row in queue}),
+        ),
+        (
+            "books_sync_queue_oldest_age_seconds",
+            "gauge",
+            "Age of the oldest document waiting in the Books Sync Queue.",
+            per_instance(
+                {
+                    row.instance: (now - row.oldest).total_seconds()
+                    for row in queue
+                    if row.oldest
+                }
+            ),
+        ),
+        (
+            "books_integration_log_unprocessed",
+            "gauge",
+            "Books Integration Logs pushed by Books that are not processed yet.",
+            per_instance({row.instance: row.logs for row in logs}),
+        ),
+        (
+            "books_integration_log_unprocessed_bytes",
+            "gauge",
+            "Size of the data of the unprocessed Books Integration Logs.",
+            per_instance({row.instance: flt(row.size) for row in logs}),
+        ),
+        (
+            "books_error_log_count",
+            "gauge",
+            "Books Error Logs by document type.",
+            [
+                ({"instance": row.instance, "doctype": row.document_type}, row.errors)
+                for row in get_error_log_counts()
+            ],
+        ),
+        (
+            "books_processed_records_per_minute",
+            "gauge",
+            f"Records pushed by Books processed per minute over the last {THROUGHPUT_WINDOW_MINUTES} minutes.",
+            per_instance(
+                {
+                    instance: flt(count) / THROUGHPUT_WINDOW_MINUTES
+                    for instance, count in processed.items()
+                }
+            ),
+        ),
+    ]
+
+
+def get_queue_stats():
+    queue = frappe.qb.DocType("Books Sync Queue")
+    return (
+        frappe.qb.from_(queue)
+        .select(
+            queue.books_instance.as_("instance"),
+            Count("*").as_("depth"),
+            Min(queue.creation).as_("oldest"),
+        )
+        .groupby(queue.books_instance)
+    ).run(as_dict=True)
+
+
+def get_unprocessed_log_stats():
+    log = frappe.qb.DocType("Books Integration Log")
+    return (
+        frappe.qb.from_(log)
+        .select(
+            log.books_instance.as_("instance"),
+            Count("*").as_("logs"),
+            Sum(log.data_size).as_("size"),
+        )
+        .where(log.processed == 0)
+        .groupby(log.books_instance)
+    ).run(as_dict=True)
+
+
+def get_error_log_counts():
+    error_log = frappe.qb.DocType("Books Error Log")
+    return (
+        frappe.qb.from_(error_log)
+        .select(
+            error_log.books_instance.as_("instance"),
+            error_log.document_type,
+            Count("*").as_("errors"),
+        )
+        .groupby(error_log.books_instance, error_log.document_type)
+    ).run(as_dict=True)
+
+
+def get_processed_record_counts(now):
+    log = frappe.qb.DocType("Books Integration Log")
+    rows = (
+        frappe.qb.from_(log)
+        .select(log.books_instance, Sum(log.record_count).as_("records"))
+        .where(log.processed_on >= add_to_date(now, minutes=-THROUGHPUT_WINDOW_MINUTES))
+        .groupby(log.books_instance)
+    ).run(as_dict=True)
+
+    return {row.books_instance: row.records for row in rows}
+
+
+def format_metrics(metrics):
+    lines = []
+    for name, metric_type, description, samples in metrics:
+        lines.append(f"# HELP {name} {description}")
+        lines.append(f"# TYPE {name} {metric_type}")
+        for labels, value in samples:
+            lines.append(f"{name}{{{format_labels(labels)}}} {format_value(value)}")
+
+    return "\n".join(lines) + "\n"
+
+
+def format_value(value):
+    value = flt(value)
+    return str(int(value)) if value.is_integer() else repr(value)
+
+
+def format_labels(labels):
+    return ",".join(
+        f'{label}="{escape_label(value)}"' for label, value in labels.items()
+    )
+
+
+def escape_label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
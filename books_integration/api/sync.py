@@ -1,54 +1,284 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+import base64
+import json
+from datetime import timedelta
+
 import frappe
-from frappe.utils import create_batch
+from frappe.utils import add_to_date, cint, create_batch, now_datetime
+from books_integration.api.transport import (
+    get_request_args,
+    make_response,
+    make_stream_response,
+)
+from books_integration.books_integration.doctype.books_ingest_receipt.books_ingest_receipt import (
+    get_receipt,
+    get_receipt_statuses,
+)
 from books_integration.doc_converter import init_doc_converter
-from books_integration.utils import get_doctype_name, update_books_reference, pretty_json
+from books_integration.doc_loader import LOAD_BATCH_SIZE, load_source_docs
+from books_integration.scheduler import enqueue_instance_transactions
+from books_integration.sync_queue import enqueue_documents, get_master_sync_doctypes
+from books_integration.utils import (
+    bulk_insert_docs,
+    get_books_references,
+    get_doctype_name,
+    get_field_hashes,
+    update_books_reference,
+)
+
+
+NDJSON_CONTENT_TYPE = "application/x-ndjson"
+STREAM_PAGE_SIZE = 500
+# sent with every delta payload so Books can identify the document, next to
+# the fbooks_key_fields of its converter
+DELTA_KEY_FIELDS = ("doctype", "name", "fbooksDocName", "books_sync_id")
+LOG_BATCH_RECORDS = 100
+LOG_BATCH_BYTES = 256 * 1024
 
 
 @frappe.whitelist(methods=["GET"])
-def get_pending_docs(instance):
-    queued_docs = frappe.db.get_all(
-        "Books Sync Queue",
-        filters={"books_instance": instance},
-        fields=["name", "document_type", "document_name", "books_instance"]
+def get_pending_docs(
+    instance, limit=None, cursor=None, format=None, delta=None, lease=None
+):
+    delta = cint(delta)
+    lease = get_lease_duration(lease)
+    if wants_ndjson(format):
+        if cursor:
+            decode_cursor(cursor)
+
+        return make_stream_response(
+            stream_pending_docs(instance, cursor, delta, lease), NDJSON_CONTENT_TYPE
+        )
+
+    limit = cint(limit)
+    if limit:
+        return make_response(
+            get_paginated_docs(instance, limit, cursor, delta, lease)
+        )
+
+    if lease:
+        queued_docs = get_queue_page(instance, lease=lease)
+        lease_queued_docs(queued_docs, lease)
+    else:
+        queued_docs = frappe.db.get_all(
+            "Books Sync Queue",
+            filters={"books_instance": instance},
+            fields=["name", "document_type", "document_name", "books_instance"]
+        )
+
+    docs, skipped = get_converted_docs(instance, queued_docs, delta)
+    return make_response({"success": True, "data": docs, "skipped": skipped})
+
+
+def get_paginated_docs(instance, limit, cursor=None, delta=False, lease=0):
+    queued_docs = get_queue_page(instance, limit + 1, cursor, lease)
+    has_more = len(queued_docs) > limit
+    queued_docs = queued_docs[:limit]
+    if lease:
+        lease_queued_docs(queued_docs, lease)
+
+    if queued_docs:
+        cursor = encode_cursor(queued_docs[-1])
+
+    docs, skipped = get_converted_docs(instance, queued_docs, delta)
+    return {
+        "success": True,
+        "data": docs,
+        "skipped": skipped,
+        "next_cursor": cursor,
+        "has_more": has_more,
+    }
+
+
+def stream_pending_docs(instance, cursor=None, delta=False, lease=0):
+    # The request has already returned when this is iterated, the database
+    # connection is reopened on the first query and closed once drained.
+    try:
+        while True:
+            queued_docs = get_queue_page(instance, STREAM_PAGE_SIZE, cursor, lease)
+            if not queued_docs:
+                break
+
+            if lease:
+                lease_queued_docs(queued_docs, lease)
+
+            skipped = []
+            for doc in iter_converted_docs(instance, queued_docs, skipped, delta):
+                yield as_ndjson(doc)
+
+            for row in skipped:
+                yield as_ndjson({**row, "skipped": True})
+
+            if len(queued_docs) < STREAM_PAGE_SIZE:
+                break
+
+            cursor = encode_cursor(queued_docs[-1])
+    finally:
+        frappe.db.commit()
+        frappe.db.close()
+
+
+def get_queue_page(instance, limit=None, cursor=None, lease=0):
+    queue = frappe.qb.DocType("Books Sync Queue")
+    query = (
+        frappe.qb.from_(queue)
+        .select(
+            queue.name, queue.creation, queue.document_type,
+            queue.document_name, queue.books_instance
+        )
+        .where(queue.books_instance == instance)
+        .orderby(queue.creation)
+        .orderby(queue.name)
     )
 
-    if not queued_docs:
-        return {"success": True, "data": []}
+    if limit:
+        query = query.limit(limit)
 
-    docs = []
-    for queued_doc in queued_docs:
-        doc = frappe.get_doc(
-            queued_doc.document_type, queued_doc.document_name
+    if lease:
+        # rows leased by a concurrent pull are locked or still leased
+        query = query.where(
+            queue.leased_until.isnull() | (queue.leased_until < now_datetime())
+        ).for_update(skip_locked=True)
+
+    if cursor:
+        last_creation, last_name = decode_cursor(cursor)
+        query = query.where(
+            (queue.creation > last_creation)
+            | ((queue.creation == last_creation) & (queue.name > last_name))
         )
-        existing_books_ref = frappe.db.get_value(
-            "Books Reference",
+
+    return query.run(as_dict=True)
+
+
+def lease_queued_docs(queued_docs, lease):
+    if queued_docs:
+        queue = frappe.qb.DocType("Books Sync Queue")
+        (
+            frappe.qb.update(queue)
+            .set(queue.leased_until, add_to_date(now_datetime(), seconds=lease))
+            .where(queue.name.isin([queued_doc.name for queued_doc in queued_docs]))
+        ).run()
+
+    # releases the row locks taken by get_queue_page
+    frappe.db.commit()
+
+
+def get_lease_duration(lease=None):
+    if lease is None:
+        lease = frappe.get_cached_doc("Books Sync Settings").pull_lease_duration
+
+    return cint(lease)
+
+
+def encode_cursor(queued_doc):
+    cursor = json.dumps([str(queued_doc.creation), queued_doc.name])
+    return base64.urlsafe_b64encode(cursor.encode()).decode()
+
+
+def decode_cursor(cursor):
+    try:
+        last_creation, last_name = json.loads(base64.urlsafe_b64decode(cursor))
+    except Exception:
+        frappe.throw("Invalid cursor")
+
+    return last_creation, last_name
+
+
+def wants_ndjson(format=None):
+    if format:
+        return format == "ndjson"
+
+    return NDJSON_CONTENT_TYPE in (frappe.get_request_header("Accept") or "")
+
+
+def as_ndjson(doc):
+    return frappe.as_json(doc, indent=None, separators=(",", ":")) + "\n"
+
+
+def get_converted_docs(instance, queued_docs, delta=False):
+    skipped = []
+    docs = list(iter_converted_docs(instance, queued_docs, skipped, delta))
+    return docs, skipped
+
+
+def iter_converted_docs(instance, queued_docs, skipped, delta=False):
+    for batch in create_batch(queued_docs, LOAD_BATCH_SIZE):
+        source_docs, missing_docs = load_source_docs(batch)
+        skipped.extend(
             {
-                "document_type": queued_doc.doctype_name,
+                "books_sync_id": queued_doc.name,
+                "document_type": queued_doc.document_type,
                 "document_name": queued_doc.document_name,
-            },
-            "books_name"
+            }
+            for queued_doc in missing_docs
         )
-        doc_converter_obj = init_doc_converter(
-            queued_doc.books_instance, doc, "fbooks"
+        books_references = get_books_references(
+            instance, list(source_docs)
         )
-        if not doc_converter_obj:
-            continue
-        compatable_doc = doc_converter_obj.get_converted_doc()
 
-        if existing_books_ref:
-            compatable_doc["fbooksDocName"] = existing_books_ref
+        sent_fields = {}
+        for queued_doc in batch:
+            doc = source_docs.get(
+                (queued_doc.document_type, queued_doc.document_name)
+            )
+            if not doc:
+                continue
+
+            existing_books_ref = books_references.get(
+                (queued_doc.document_type, queued_doc.document_name)
+            )
+            doc_converter_obj = init_doc_converter(instance, doc, "fbooks")
+            if not doc_converter_obj:
+                continue
+            compatable_doc = doc_converter_obj.get_converted_doc()
+
+            if existing_books_ref:
+                compatable_doc["fbooksDocName"] = existing_books_ref.books_name
+
+            compatable_doc["books_sync_id"] = queued_doc.name
+
+            if delta:
+                key_fields = DELTA_KEY_FIELDS + doc_converter_obj.fbooks_key_fields
+                field_hashes = get_field_hashes(compatable_doc, key_fields)
+                sent_fields[queued_doc.name] = {"sent_fields": json.dumps(field_hashes)}
+
+                if existing_books_ref and existing_books_ref.synced_fields:
+                    compatable_doc = get_delta_doc(
+                        compatable_doc,
+                        field_hashes,
+                        json.loads(existing_books_ref.synced_fields),
+                        key_fields,
+                    )
+
+            yield compatable_doc
 
-        compatable_doc["books_sync_id"] = queued_doc.name
-        docs.append(compatable_doc)
+        if sent_fields:
+            frappe.db.bulk_update(
+                "Books Sync Queue", sent_fields, update_modified=False
+            )
+            frappe.local.flags.commit = True
+
+
+def get_delta_doc(doc, field_hashes, synced_fields, key_fields=DELTA_KEY_FIELDS):
+    """Returns doc with only the fields that changed since Books acknowledged it."""
+    delta_doc = {field: doc[field] for field in key_fields if field in doc}
+    for field, field_hash in field_hashes.items():
+        if synced_fields.get(field) != field_hash:
+            delta_doc[field] = doc[field]
 
-    return {"success": True, "data": docs}
+    delta_doc["isDelta"] = True
+    return delta_doc
 
 
 @frappe.whitelist(methods=["POST"])
-def initiate_master_sync(instance, records):
+def initiate_master_sync(instance=None, records=None):
+    args = get_request_args(instance=instance, records=records)
+    return make_response(enqueue_master_sync(args.instance, args.records))
+
+
+def enqueue_master_sync(instance, records):
     if not records:
         return {"success": False, "message": "No records found"}
     
@@ -58,71 +288,227 @@ def initiate_master_sync(instance, records):
     success_log = []
     failed_log = []
 
+    doctypes = {}
+    records_by_doctype = {}
     for record in records:
-        try:
-            data = {
-                "doctype": "Books Sync Queue",
-                "document_type": get_doctype_name(
-                    record.get("referenceType"), "erpn"
-                ),
-                "document_name": record.get("documentName"),
-            }
-            is_pending = frappe.db.exists(data)
+        log = {
+            "document_name": record.get("documentName"),
+            "doctype_name": record.get("referenceType"),
+        }
 
-            if not is_pending:
-                frappe.get_doc(data).save()
+        if log["doctype_name"] not in doctypes:
+            doctypes[log["doctype_name"]] = get_doctype_name(
+                log["doctype_name"], "erpn"
+            )
 
-            success_log.append(
-                {
-                    "document_name": record.get("documentName"),
-                    "doctype_name": record.get("referenceType"),
-                }
+        doctype = doctypes[log["doctype_name"]]
+        if not doctype or not log["document_name"]:
+            failed_log.append(log)
+            continue
+
+        records_by_doctype.setdefault(doctype, []).append(log)
+
+    for doctype, logs in records_by_doctype.items():
+        try:
+            frappe.db.savepoint("books_master_sync")
+            enqueue_documents(
+                instance, doctype, [log["document_name"] for log in logs]
             )
+            success_log.extend(logs)
         except Exception:
+            frappe.db.rollback(save_point="books_master_sync")
             frappe.log_error(
                 title=f"Books Integration Error - {instance}",
                 message=frappe.get_traceback(),
             )
 
-            failed_log.append(
-                {
-                    "document_name": record.get("documentName"),
-                    "doctype_name": record.get("referenceType"),
-                }
-            )
+            failed_log.extend(logs)
 
     return {"success": True, "success_log": success_log, "failed_log": failed_log}
 
 
 @frappe.whitelist(methods=["POST"])
-def sync_transactions(instance, records):
-    batches = create_batch(records, 15)
-    for batch in batches:
-        doc = frappe.new_doc("Books Integration Log")
-        doc.books_instance = instance
-        doc.data = pretty_json(batch)
-        doc.save(ignore_permissions=True)
+def start_master_sync(instance=None, doctypes=None):
+    args = get_request_args(instance=instance, doctypes=doctypes)
+    return make_response(enqueue_server_master_sync(args.instance, args.doctypes))
+
+
+def enqueue_server_master_sync(instance, doctypes=None):
+    if not instance or not frappe.db.exists("Books Instance", instance):
+        return {"success": False, "message": "Books instance not found"}
+
+    if not frappe.get_cached_doc("Books Sync Settings").enable_sync:
+        return {"success": False, "message": "Sync is disabled"}
+
+    if isinstance(doctypes, str):
+        doctypes = frappe.parse_json(doctypes)
+
+    doctypes = get_master_sync_doctypes(doctypes)
+    if not doctypes:
+        return {"success": False, "message": "No doctypes to sync"}
 
     frappe.enqueue(
-        "books_integration.scheduler.process_transactions",
+        "books_integration.sync_queue.enqueue_all_documents",
         queue="long",
+        timeout=3600,
         enqueue_after_commit=True,
-        job_id="BOOKS_SYNC_TRANSACTION_JOB",
-        deduplicate=True
+        job_id=f"BOOKS_MASTER_SYNC_JOB::{instance}",
+        deduplicate=True,
+        instance=instance,
+        doctypes=doctypes,
     )
 
+    return {"success": True, "message": "Master sync started", "doctypes": doctypes}
+
+
+@frappe.whitelist(methods=["POST"])
+def sync_transactions(instance=None, records=None):
+    args = get_request_args(instance=instance, records=records)
+    return make_response(store_transactions(args.instance, args.records))
+
+
+def store_transactions(instance, records):
+    if not records:
+        return {"success": False, "message": "No records found"}
+
+    receipts = [get_receipt(instance, record) for record in records]
+    existing_receipts = get_receipt_statuses([receipt.name for receipt in receipts])
+
+    pending_logs = get_pending_logs(existing_receipts)
+
+    accepted = []
+    duplicates = []
+    new_receipts = {}
+    for record, receipt in zip(records, receipts):
+        record_id = {"doctype": record.get("doctype"), "name": record.get("name")}
+        if receipt.name in new_receipts or is_received(
+            existing_receipts.get(receipt.name), pending_logs
+        ):
+            duplicates.append(record_id)
+            continue
+
+        new_receipts[receipt.name] = (record, receipt)
+        accepted.append(record_id)
+
+    if new_receipts:
+        save_transactions(instance, list(new_receipts.values()), existing_receipts)
+
     return {
         "success": True,
         "message": "Books Integration Log created successfully",
+        "accepted": accepted,
+        "duplicates": duplicates,
+    }
+
+
+def get_pending_logs(existing_receipts):
+    """Returns the unprocessed logs of the pending receipts."""
+    log_names = {
+        receipt.books_integration_log
+        for receipt in existing_receipts.values()
+        if receipt.status == "Pending" and receipt.books_integration_log
     }
+    if not log_names:
+        return set()
+
+    return set(
+        frappe.get_all(
+            "Books Integration Log",
+            filters={"name": ("in", list(log_names)), "processed": 0},
+            pluck="name",
+        )
+    )
+
+
+def is_received(existing_receipt, pending_logs):
+    """Whether a record is processed or pending in an unprocessed log."""
+    if not existing_receipt:
+        return False
+
+    if existing_receipt.status == "Pending":
+        return existing_receipt.books_integration_log in pending_logs
+
+    return existing_receipt.status == "Processed"
+
+
+def save_transactions(instance, records, existing_receipts):
+    sync_time = now_datetime()
+    logs = []
+    receipts = []
+    start = 0
+    for index, (count, size, data) in enumerate(
+        get_log_batches([record for record, _ in records])
+    ):
+        log_name = frappe.generate_hash(length=10)
+        logs.append(
+            {
+                "name": log_name,
+                # logs are claimed by creation, the names are random
+                "creation": sync_time + timedelta(microseconds=index),
+                "books_instance": instance,
+                "processed": 0,
+                "record_count": count,
+                "data_size": size,
+                "sync_time": sync_time,
+                "data": data,
+            }
+        )
+        receipts.extend(
+            {**receipt, "status": "Pending", "books_integration_log": log_name}
+            for _, receipt in records[start:start + count]
+        )
+        start += count
+
+    retried = [receipt["name"] for receipt in receipts if receipt["name"] in existing_receipts]
+    if retried:
+        frappe.db.delete("Books Ingest Receipt", {"name": ("in", retried)})
+
+    # receipts go first, a concurrent push of the same records fails on
+    # their primary key instead of storing the records twice
+    bulk_insert_docs("Books Ingest Receipt", receipts)
+    bulk_insert_docs("Books Integration Log", logs)
+
+    enqueue_instance_transactions(instance)
+
+
+def get_log_batches(records):
+    """Yields the record count, byte size and JSON data of every log batch of records."""
+    batch = []
+    batch_size = 1
+    for record in records:
+        data = frappe.as_json(record, indent=None, separators=(",", ":"))
+        data_size = len(data.encode())
+        if batch and (
+            len(batch) >= LOG_BATCH_RECORDS
+            or batch_size + data_size + 1 > LOG_BATCH_BYTES
+        ):
+            yield len(batch), batch_size, "[" + ",".join(batch) + "]"
+            batch = []
+            batch_size = 1
+
+        batch.append(data)
+        # the data plus the opening bracket or comma before it
+        batch_size += data_size + 1
+
+    if batch:
+        yield len(batch), batch_size, "[" + ",".join(batch) + "]"
 
 
 @frappe.whitelist(methods=["POST"])
-def update_status(instance, data):
+def update_status(instance=None, data=None):
+    args = get_request_args(instance=instance, data=data)
+    return make_response(acknowledge_doc(args.instance, args.data))
+
+
+def acknowledge_doc(instance, data):
     ref_data = {
         "doctype": data.get("doctype"),
         "name": data.get("nameInERPNext"),
         "books_name": data.get("nameInFBooks"),
+        # payload Books now holds, compared against for the next delta pull
+        "synced_fields": frappe.db.get_value(
+            "Books Sync Queue", data.get("books_sync_id"), "sent_fields"
+        ),
     }
 
     update_books_reference(instance, ref_data)
@@ -136,3 +522,86 @@ def update_status(instance, data):
         return {"success": False}
 
     return {"success": True}
+
+
+@frappe.whitelist(methods=["POST"])
+def bulk_update_status(instance=None, data=None):
+    args = get_request_args(instance=instance, data=data)
+    return make_response(acknowledge_docs(args.instance, args.data))
+
+
+def acknowledge_docs(instance, items):
+    if not items:
+        return {"success": False, "message": "No records found"}
+
+    queued_docs = {
+        row.name: row
+        for row in frappe.get_all(
+            "Books Sync Queue",
+            filters={
+                "name": ("in", [item.get("books_sync_id") for item in items]),
+                "books_instance": instance,
+            },
+            fields=["name", "sent_fields"],
+        )
+    }
+
+    results = []
+    references = {}
+    acknowledged = []
+    for item in items:
+        result = {"books_sync_id": item.get("books_sync_id"), "success": True}
+        results.append(result)
+
+        doctype = get_doctype_name(item.get("doctype"), "erpn")
+        if not (doctype and item.get("nameInERPNext") and item.get("nameInFBooks")):
+            result.update(success=False, message="Invalid document reference")
+            continue
+
+        queued_doc = queued_docs.get(item.get("books_sync_id"))
+        references[(doctype, item.get("nameInERPNext"))] = {
+            "books_name": item.get("nameInFBooks"),
+            "synced_fields": queued_doc.sent_fields if queued_doc else None,
+        }
+
+        if queued_doc:
+            acknowledged.append(queued_doc.name)
+        else:
+            result.update(success=False, message="Books Sync Queue entry not found")
+
+    upsert_books_references(instance, references)
+
+    # rejected items stay queued so that Books pulls them again
+    if acknowledged:
+        frappe.db.delete("Books Sync Queue", {"name": ("in", acknowledged)})
+
+    return {"success": True, "data": results}
+
+
+def upsert_books_references(instance, references):
+    existing_refs = get_books_references(instance, list(references))
+
+    new_refs = []
+    updated_refs = {}
+    for (doctype, name), values in references.items():
+        existing_ref = existing_refs.get((doctype, name))
+        if not existing_ref:
+            new_refs.append(
+                {
+                    "document_type": doctype,
+                    "document_name": name,
+                    "books_instance": instance,
+                    **values,
+                }
+            )
+            continue
+
+        if (
+            existing_ref.books_name != values["books_name"]
+            or existing_ref.synced_fields != values["synced_fields"]
+        ):
+            updated_refs[existing_ref.name] = values
+
+    bulk_insert_docs("Books Reference", new_refs)
+    if updated_refs:
+        frappe.db.bulk_update("Books Reference", updated_refs)
@@ -0,0 +1,49 @@
+# Copyright (c) 2024, Wahni IT Solutions and Contributors
+# See license.txt
+
+import json
+import unittest
+
+from books_integration.api.sync import LOG_BATCH_BYTES, LOG_BATCH_RECORDS, get_log_batches
+
+
+def make_records(count, size=0):
+    return [
+        {"doctype": "Item", "name": f"ITEM-{index}", "description": "x" * size}
+        for index in range(count)
+    ]
+
+
+class TestLogBatches(unittest.TestCase):
+    def check_batches(self, records):
+        batches = list(get_log_batches(records))
+        for count, size, data in batches:
+            self.assertEqual(len(json.loads(data)), count)
+            self.assertEqual(len(data.encode()), size)
+
+        self.assertEqual(
+            [record for _, _, data in batches for record in json.loads(data)], records
+        )
+        return batches
+
+    def test_record_cap(self):
+        batches = self.check_batches(make_records(LOG_BATCH_RECORDS * 2 + 1))
+        self.assertEqual(
+            [count for count, _, _ in batches], [LOG_BATCH_RECORDS, LOG_BATCH_RECORDS, 1]
+        )
+
+    def test_byte_cap(self):
+        # three records fit in a batch
+        batches = self.check_batches(make_records(7, LOG_BATCH_BYTES // 3 - 100))
+        self.assertEqual([count for count, _, _ in batches], [3, 3, 1])
+        self.assertTrue(all(size <= LOG_BATCH_BYTES for _, size, _ in batches))
+
+    def test_oversized_record_is_stored_alone(self):
+        records = make_records(3)
+        records.insert(1, make_records(1, LOG_BATCH_BYTES)[0])
+        batches = self.check_batches(records)
+        self.assertEqual([count for count, _, _ in batches], [1, 1, 2])
+        self.assertGreater(batches[1][1], LOG_BATCH_BYTES)
+
+    def test_no_records(self):
+        self.assertEqual(list(get_log_batches([])), [])
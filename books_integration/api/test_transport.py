@@ -0,0 +1,122 @@
+# Copyright (c) 2024, Wahni IT Solutions and Contributors
+# See license.txt
+
+import gzip
+import json
+import unittest
+from unittest.mock import patch
+
+import frappe
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.test import EnvironBuilder
+
+from books_integration.api import transport
+
+
+def make_request(data=b"", headers=None, content_type="application/octet-stream"):
+    return EnvironBuilder(
+        method="POST", data=data, headers=headers or {}, content_type=content_type
+    ).get_request()
+
+
+def with_request(request):
+    return patch.object(frappe.local, "request", request, create=True)
+
+
+class TestDecompressGzip(unittest.TestCase):
+    def test_decompresses_body(self):
+        self.assertEqual(transport.decompress_gzip(gzip.compress(b"books"), 100), b"books")
+
+    def test_reads_every_member(self):
+        data = gzip.compress(b"ab") + gzip.compress(b"cd")
+        self.assertEqual(transport.decompress_gzip(data, 4), b"abcd")
+
+    def test_rejects_body_over_cap(self):
+        with self.assertRaises(RequestEntityTooLarge) as context:
+            transport.decompress_gzip(gzip.compress(b"\0" * 10**7), 10**6)
+
+        self.assertEqual(context.exception.code, 413)
+
+    def test_cap_counts_every_member(self):
+        data = gzip.compress(b"ab") + gzip.compress(b"cd")
+        with self.assertRaises(RequestEntityTooLarge):
+            transport.decompress_gzip(data, 3)
+
+    def test_rejects_truncated_body(self):
+        with self.assertRaises(frappe.ValidationError):
+            transport.decompress_gzip(gzip.compress(b"x" * 1000)[:-10], 10**6)
+
+    def test_rejects_garbage(self):
+        with self.assertRaises(frappe.ValidationError):
+            transport.decompress_gzip(b"not gzip", 10**6)
+
+
+class TestRequestPayload(unittest.TestCase):
+    def test_without_request(self):
+        with with_request(None):
+            self.assertIsNone(transport.get_request_payload())
+
+    def test_plain_json_is_left_to_frappe(self):
+        request = make_request(b'{"instance": "books"}', content_type="application/json")
+        with with_request(request):
+            self.assertIsNone(transport.get_request_payload())
+
+    def test_gzip_json(self):
+        request = make_request(
+            gzip.compress(b'{"instance": "books"}'), {"Content-Encoding": "gzip"}
+        )
+        with with_request(request):
+            self.assertEqual(transport.get_request_payload(), {"instance": "books"})
+
+    def test_gzip_over_request_limit(self):
+        request = make_request(
+            gzip.compress(json.dumps({"data": "x" * 2048}).encode()),
+            {"Content-Encoding": "gzip"},
+        )
+        request.max_content_length = 1024
+        with with_request(request), self.assertRaises(RequestEntityTooLarge):
+            transport.get_request_payload()
+
+    @unittest.skipUnless(transport.msgpack, "msgpack is not installed")
+    def test_gzip_msgpack(self):
+        request = make_request(
+            gzip.compress(transport.msgpack.packb({"instance": "books"})),
+            {"Content-Encoding": "gzip"},
+            transport.MSGPACK_CONTENT_TYPE,
+        )
+        with with_request(request):
+            self.assertEqual(transport.get_request_payload(), {"instance": "books"})
+
+
+class TestMakeResponse(unittest.TestCase):
+    def test_plain_json_is_left_to_frappe(self):
+        with with_request(make_request()):
+            self.assertEqual(transport.make_response({"success": True}), {"success": True})
+
+    def test_gzip_large_body(self):
+        data = {"data": "x" * transport.GZIP_MIN_SIZE}
+        with with_request(make_request(headers={"Accept-Encoding": "gzip"})):
+            response = transport.make_response(data)
+
+        self.assertEqual(response.headers["Content-Encoding"], "gzip")
+        self.assertEqual(
+            json.loads(gzip.decompress(response.get_data())), {"message": data}
+        )
+
+    def test_small_body_is_not_compressed(self):
+        with with_request(make_request(headers={"Accept-Encoding": "gzip"})):
+            response = transport.make_response({"success": True})
+
+        self.assertNotIn("Content-Encoding", response.headers)
+        self.assertEqual(json.loads(response.get_data()), {"message": {"success": True}})
+
+    @unittest.skipUnless(transport.msgpack, "msgpack is not installed")
+    def test_msgpack(self):
+        request = make_request(headers={"Accept": transport.MSGPACK_CONTENT_TYPE})
+        with with_request(request):
+            response = transport.make_response({"success": True})
+
+        self.assertEqual(response.mimetype, transport.MSGPACK_CONTENT_TYPE)
+        self.assertEqual(
+            transport.msgpack.unpackb(response.get_data()), {"message": {"success": True}}
+        )
@@ -0,0 +1,141 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import gzip
+import json
+import zlib
+
+import frappe
+from frappe.utils.response import json_handler
+from werkzeug.exceptions import RequestEntityTooLarge
+from werkzeug.wrappers import Response
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+JSON_CONTENT_TYPE = "application/json"
+MSGPACK_CONTENT_TYPE = "application/msgpack"
+GZIP_MIN_SIZE = 1024
+# frappe's default limit of request bodies, used when the request has none
+MAX_DECOMPRESSED_SIZE = 25 * 1024 * 1024
+
+
+def get_request_args(**args):
+    """Returns the endpoint arguments, overridden by a gzip or msgpack request body."""
+    args = frappe._dict(args)
+    payload = get_request_payload()
+    if payload:
+        args.update(payload)
+
+    return args
+
+
+def get_request_payload():
+    request = frappe.request
+    if not request:
+        return
+
+    is_gzip = (request.headers.get("Content-Encoding") or "").lower() == "gzip"
+    is_msgpack = request.mimetype == MSGPACK_CONTENT_TYPE
+    if not (is_gzip or is_msgpack):
+        return
+
+    data = request.get_data()
+    if not data:
+        return
+
+    if is_gzip:
+        data = decompress_gzip(
+            data, request.max_content_length or MAX_DECOMPRESSED_SIZE
+        )
+
+    if is_msgpack:
+        if not msgpack:
+            frappe.throw("msgpack is not installed on the server")
+        return msgpack.unpackb(data)
+
+    return json.loads(data)
+
+
+def decompress_gzip(data, max_size):
+    """Decompresses a gzip body, rejecting it past max_size decompressed bytes."""
+    chunks = []
+    size = 0
+    # a gzip body may hold several members, as gzip.decompress reads them
+    while data:
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            chunk = decompressor.decompress(data, max_size - size + 1)
+        except zlib.error:
+            frappe.throw("Invalid gzip request body")
+
+        size += len(chunk)
+        if size > max_size:
+            raise RequestEntityTooLarge(
+                f"Decompressed request body is larger than {max_size} bytes"
+            )
+
+        if not decompressor.eof:
+            frappe.throw("Truncated gzip request body")
+
+        chunks.append(chunk)
+        data = decompressor.unused_data
+
+    return b"".join(chunks)
+
+
+def make_response(data):
+    """Returns data as msgpack and/or gzip when the client accepts it, else as is."""
+    use_msgpack = accepts_msgpack()
+    use_gzip = accepts_gzip()
+    if not (use_msgpack or use_gzip):
+        return data
+
+    if use_msgpack:
+        content_type = MSGPACK_CONTENT_TYPE
+        body = msgpack.packb({"message": data}, default=json_handler)
+    else:
+        content_type = JSON_CONTENT_TYPE
+        body = frappe.as_json(
+            {"message": data}, indent=None, separators=(",", ":")
+        ).encode()
+
+    headers = {"Vary": "Accept, Accept-Encoding"}
+    if use_gzip and len(body) >= GZIP_MIN_SIZE:
+        body = gzip.compress(body, compresslevel=6)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(body, content_type=content_type, headers=headers)
+
+
+def make_stream_response(chunks, content_type):
+    headers = {"Vary": "Accept-Encoding"}
+    if accepts_gzip():
+        chunks = iter_gzip(chunks)
+        headers["Content-Encoding"] = "gzip"
+
+    return Response(chunks, content_type=content_type, headers=headers)
+
+
+def iter_gzip(chunks):
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        data = compressor.compress(chunk.encode())
+        if data:
+            yield data
+
+    yield compressor.flush()
+
+
+def accepts_msgpack():
+    if not msgpack:
+        return False
+
+    return MSGPACK_CONTENT_TYPE in (frappe.get_request_header("Accept") or "")
+
+
+def accepts_gzip():
+    return "gzip" in (frappe.get_request_header("Accept-Encoding") or "")
@@ -3,11 +3,15 @@
 
 import frappe
 import json
+import re
 from frappe.model.document import Document
 from books_integration.scheduler import process_data
 
 
 class BooksErrorLog(Document):
+	def validate(self):
+		self.error_signature = get_error_signature(self.error)
+
 	@frappe.whitelist()
 	def retry_processing(self):
 		data = json.loads(self.data)
@@ -16,3 +20,22 @@ class BooksErrorLog(Document):
 		)
 		frappe.msgprint("Processed")
 		self.delete()
+
+
+def get_error_signature(error):
+	"""Returns the exception line of a traceback with values masked."""
+	lines = [line.strip() for line in (error or "").splitlines() if line.strip()]
+	if not lines:
+		return
+
+	signature = re.sub(r"(['\"]).*?\1", r"\1?\1", lines[-1])
+	signature = re.sub(r"\d+", "0", signature)
+	return signature[:140]
+
+
+@frappe.whitelist()
+def bulk_replay(books_instance=None, document_type=None, error_signature=None):
+	from books_integration.scheduler.replay import enqueue_replay_error_logs
+
+	frappe.has_permission("Books Error Log", "delete", throw=True)
+	return enqueue_replay_error_logs(books_instance, document_type, error_signature)
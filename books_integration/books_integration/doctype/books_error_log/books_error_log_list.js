@@ -0,0 +1,56 @@
+// Copyright (c) 2024, Wahni IT Solutions and contributors
+// For license information, please see license.txt
+
+frappe.listview_settings["Books Error Log"] = {
+	onload(listview) {
+		listview.page.add_inner_button(__("Replay"), function () {
+			const filters = {};
+			for (const [, fieldname, condition, value] of listview.filter_area.get()) {
+				if (condition === "=") {
+					filters[fieldname] = value;
+				}
+			}
+
+			const dialog = new frappe.ui.Dialog({
+				title: __("Replay Books Error Logs"),
+				fields: [
+					{
+						fieldname: "books_instance",
+						fieldtype: "Link",
+						label: __("Books Instance"),
+						options: "Books Instance",
+						default: filters.books_instance,
+					},
+					{
+						fieldname: "document_type",
+						fieldtype: "Link",
+						label: __("Document Type"),
+						options: "DocType",
+						default: filters.document_type,
+					},
+					{
+						fieldname: "error_signature",
+						fieldtype: "Data",
+						label: __("Error Signature"),
+						default: filters.error_signature,
+					},
+				],
+				primary_action_label: __("Replay"),
+				primary_action(values) {
+					frappe.call({
+						method: "books_integration.books_integration.doctype.books_error_log.books_error_log.bulk_replay",
+						args: values,
+						callback(r) {
+							frappe.show_alert({
+								message: __("Replaying {0} Books Error Logs in the background", [r.message]),
+								indicator: "blue",
+							});
+						},
+					});
+					dialog.hide();
+				},
+			});
+			dialog.show();
+		});
+	},
+};
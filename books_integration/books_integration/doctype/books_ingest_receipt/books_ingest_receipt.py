@@ -0,0 +1,55 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import hashlib
+
+import frappe
+from frappe.model.document import Document
+from frappe.query_builder import Interval
+from frappe.query_builder.functions import Now
+from books_integration.utils import get_payload_hash
+
+
+class BooksIngestReceipt(Document):
+	@staticmethod
+	def clear_old_logs(days=30):
+		table = frappe.qb.DocType("Books Ingest Receipt")
+		frappe.db.delete(table, filters=(table.modified < (Now() - Interval(days=days))))
+
+
+def get_receipt(instance, record):
+	"""Returns the receipt of a record, named after its identity and content."""
+	content_hash = get_payload_hash(record)
+	key = "\0".join(
+		(instance, record.get("doctype") or "", record.get("name") or "", content_hash)
+	)
+
+	return frappe._dict(
+		name=hashlib.sha1(key.encode()).hexdigest(),
+		books_instance=instance,
+		books_doctype=record.get("doctype"),
+		books_name=record.get("name"),
+		content_hash=content_hash,
+	)
+
+
+def get_receipt_statuses(names):
+	if not names:
+		return {}
+
+	return {
+		receipt.name: receipt
+		for receipt in frappe.get_all(
+			"Books Ingest Receipt",
+			filters={"name": ("in", list(set(names)))},
+			fields=["name", "status", "books_integration_log"],
+		)
+	}
+
+
+def set_receipt_statuses(statuses):
+	if statuses:
+		frappe.db.bulk_update(
+			"Books Ingest Receipt",
+			{name: {"status": status} for name, status in statuses.items()},
+		)
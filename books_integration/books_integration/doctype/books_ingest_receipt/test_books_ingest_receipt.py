@@ -0,0 +1,81 @@
+# Copyright (c) 2024, Wahni IT Solutions and Contributors
+# See license.txt
+
+import json
+
+import frappe
+from frappe.tests.utils import FrappeTestCase
+from books_integration.api.sync import get_log_batches, is_received
+from books_integration.books_integration.doctype.books_ingest_receipt.books_ingest_receipt import (
+	get_receipt,
+)
+from books_integration.scheduler import is_duplicate
+
+
+RECORDS = [
+	{
+		"doctype": "SalesInvoice",
+		"name": "SINV-1001",
+		"party": "Café Rio",
+		"grandTotal": 1180.5,
+		"items": [{"item": "Tea", "quantity": 2, "rate": 500.25}],
+		"submitted": True,
+	},
+	{"doctype": "Payment", "name": "PAY-1001", "amount": 0.1 + 0.2},
+]
+
+
+def get_receipt_row(status, log="LOG-1"):
+	return frappe._dict(status=status, books_integration_log=log)
+
+
+class TestBooksIngestReceipt(FrappeTestCase):
+	def test_receipt_survives_log_round_trip(self):
+		stored = [
+			record
+			for _, _, data in get_log_batches(RECORDS)
+			for record in json.loads(data)
+		]
+
+		self.assertEqual(
+			[get_receipt("books", record).name for record in stored],
+			[get_receipt("books", record).name for record in RECORDS],
+		)
+
+	def test_receipt_ignores_key_order(self):
+		record = RECORDS[1]
+		reordered = dict(reversed(list(record.items())))
+		self.assertEqual(get_receipt("books", record).name, get_receipt("books", reordered).name)
+
+	def test_receipt_changes_with_content_and_instance(self):
+		record = RECORDS[1]
+		name = get_receipt("books", record).name
+		self.assertNotEqual(name, get_receipt("books", {**record, "amount": 1}).name)
+		self.assertNotEqual(name, get_receipt("other-books", record).name)
+
+	def test_is_received(self):
+		pending_logs = {"LOG-1"}
+		self.assertFalse(is_received(None, pending_logs))
+		self.assertTrue(is_received(get_receipt_row("Processed", "LOG-2"), pending_logs))
+		self.assertTrue(is_received(get_receipt_row("Pending"), pending_logs))
+		# the log was processed or deleted without settling the record
+		self.assertFalse(is_received(get_receipt_row("Pending", "LOG-2"), pending_logs))
+		self.assertFalse(is_received(get_receipt_row("Failed"), pending_logs))
+
+	def test_is_duplicate(self):
+		receipt = frappe._dict(name="receipt")
+
+		def check(existing_receipt, log_name="LOG-1", processed=()):
+			existing_receipts = {"receipt": existing_receipt} if existing_receipt else {}
+			return is_duplicate(log_name, receipt, existing_receipts, set(processed))
+
+		self.assertFalse(check(None))
+		self.assertTrue(check(None, processed=["receipt"]))
+		self.assertFalse(check(get_receipt_row("Pending")))
+		# settled by an earlier run of the same log
+		self.assertTrue(check(get_receipt_row("Processed")))
+		self.assertTrue(check(get_receipt_row("Failed")))
+		# resent from another log
+		self.assertTrue(check(get_receipt_row("Processed", "LOG-2")))
+		self.assertFalse(check(get_receipt_row("Failed", "LOG-2")))
+		self.assertFalse(check(get_receipt_row("Pending", "LOG-2")))
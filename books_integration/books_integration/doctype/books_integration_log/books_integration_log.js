@@ -1,8 +1,16 @@
 // Copyright (c) 2024, Wahni IT Solutions and contributors
 // For license information, please see license.txt
 
-// frappe.ui.form.on("Books Integration Log", {
-// 	refresh(frm) {
+frappe.ui.form.on("Books Integration Log", {
+	refresh(frm) {
+		// payloads are stored minified, indent them for reading
+		if (!frm.doc.data) return;
 
-// 	},
-// });
+		try {
+			frm.doc.data = JSON.stringify(JSON.parse(frm.doc.data), null, 4);
+			frm.refresh_field("data");
+		} catch (e) {
+			// leave payloads that are not valid JSON as they are
+		}
+	},
+});
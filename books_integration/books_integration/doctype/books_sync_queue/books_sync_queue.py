@@ -1,9 +1,17 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
-# import frappe
+import frappe
 from frappe.model.document import Document
 
 
 class BooksSyncQueue(Document):
 	pass
+
+
+def on_doctype_update():
+	frappe.db.add_unique(
+		"Books Sync Queue",
+		["document_type", "document_name", "books_instance"],
+		constraint_name="unique_queued_document",
+	)
@@ -0,0 +1,35 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import click
+import frappe
+from frappe.commands import get_site, pass_context
+
+
+@click.command("books-load-test")
+@click.option("--instances", default=5, help="Number of simulated Books instances")
+@click.option("--duration", default=60, help="Seconds to generate load for")
+@click.option("--push-rate", default=0.5, help="Pushes per instance per second")
+@click.option("--records", default=10, help="Records per push")
+@click.option("--payment-ratio", default=0.5, help="Share of records that pay a pushed invoice")
+@click.option("--items-per-invoice", default=5, help="Maximum items per invoice")
+@click.option("--poll-rate", default=0.2, help="Pulls of pending docs per instance per second")
+@click.option("--pull-limit", default=100, help="Documents per pull")
+@click.option("--drain", is_flag=True, help="Process the remaining backlog at the end")
+@click.option("--prefix", default="loadtest", help="Prefix of the simulated instance names")
+@click.option("--pos-profile", help="POS Profile to set on the simulated instances")
+@pass_context
+def books_load_test(context, **options):
+    """Simulate Books instances syncing with a test site and report the figures."""
+    from books_integration.load_generator import run_load_test
+
+    site = get_site(context)
+    frappe.init(site=site)
+    frappe.connect()
+    try:
+        run_load_test(echo=click.echo, **options)
+    finally:
+        frappe.destroy()
+
+
+commands = [books_load_test]
@@ -4,10 +4,17 @@
 import frappe
 from frappe.model.document import Document
 from frappe.utils import flt, getdate
-from books_integration.utils import get_doctype_name
+from books_integration.utils import get_doctype_name, get_memoized_value, memoized_exists
 
 
 class DocConverterBase:
+    # ERPNext fields read while filling missing values for Books that are
+    # not part of field_map, used to project bulk loaded source documents
+    erpn_extra_fields = ()
+    erpn_extra_child_fields = {}
+    # fields Books needs to route the document, sent with every delta
+    fbooks_key_fields = ()
+
     def __init__(self, instance, dirty_doc, target: str) -> None:
         self.doc_dict = dirty_doc
         if isinstance(self.doc_dict, Document):
@@ -83,6 +90,25 @@ class DocConverterBase:
 
         return self.field_map.get(field)
 
+    def get_source_fields(self):
+        if self.target == "erpn":
+            return [], {}
+
+        fields = [field for field in self.field_map if field != "child_tables"]
+        fields.extend(self.erpn_extra_fields)
+
+        child_fields = {}
+        for child_table in (self.field_map.get("child_tables") or []):
+            if not child_table.get("erpn_fieldname"):
+                continue
+
+            child_fields[child_table["erpn_fieldname"]] = list(child_table["fieldmap"])
+
+        for fieldname, extra_fields in self.erpn_extra_child_fields.items():
+            child_fields.setdefault(fieldname, []).extend(extra_fields)
+
+        return fields, child_fields
+
     def _fill_missing_values_for_fbooks(self):
         pass
 
@@ -157,6 +183,8 @@ def init_doc_converter(instance, doc_dict, target: str):
 
 
 class Item(DocConverterBase):
+    erpn_extra_child_fields = {"taxes": ["item_tax_template"]}
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             "image": "image",
@@ -229,6 +257,8 @@ class Item(DocConverterBase):
 
 
 class Customer(DocConverterBase):
+    fbooks_key_fields = ("role",)
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             "name": "name",
@@ -240,7 +270,7 @@ class Customer(DocConverterBase):
 
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["customer_name"] = self._dirty_doc.get("name")
-        address_name = frappe.db.get_value(
+        address_name = get_memoized_value(
             "Books Reference",
             {
                 "document_type": "Address",
@@ -256,6 +286,8 @@ class Customer(DocConverterBase):
 
 
 class Supplier(DocConverterBase):
+    fbooks_key_fields = ("role",)
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             "name": "name",
@@ -268,7 +300,7 @@ class Supplier(DocConverterBase):
     def _fill_missing_values_for_erpn(self):
         self.converted_doc["supplier_name"] = self._dirty_doc.get("name")
 
-        address_name = frappe.db.get_value(
+        address_name = get_memoized_value(
             "Books Reference",
             {
                 "document_type": "Address",
@@ -284,6 +316,8 @@ class Supplier(DocConverterBase):
 
 
 class SalesInvoice(DocConverterBase):
+    erpn_extra_fields = ("docstatus",)
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             # "name": "name",
@@ -334,13 +368,13 @@ class SalesInvoice(DocConverterBase):
         self.converted_doc["posting_date"] = getdate(
             self.converted_doc["posting_date"]
         )
-        pos_profile = frappe.db.get_value(
+        pos_profile = get_memoized_value(
             "Books Instance", self.instance, "pos_profile"
         )
         if not pos_profile:
             frappe.throw(("POS Profile not set in Books Instance {0}").format(self.instance))
     
-        pos_details = frappe.db.get_value(
+        pos_details = get_memoized_value(
             "POS Profile", pos_profile, ["company", "customer"], as_dict=True
         )
         self.converted_doc["is_pos"] = 1
@@ -397,7 +431,7 @@ class PaymentEntry(DocConverterBase):
         if self._dirty_doc.get("paymentMethod") == "Transfer":
             self.converted_doc["mode_of_payment"] = "Bank Draft"
 
-        is_party_is_customer = frappe.db.exists("Customer", self.converted_doc["party"])
+        is_party_is_customer = memoized_exists("Customer", self.converted_doc["party"])
 
         if is_party_is_customer:
             self.converted_doc["party_type"] = "Customer"
@@ -417,7 +451,7 @@ class PaymentEntry(DocConverterBase):
         )
 
         for row in self.converted_doc["references"]:
-            reference_name_in_erpn = frappe.db.get_value(
+            reference_name_in_erpn = get_memoized_value(
                 "Books Reference",
                 {"books_name": row["reference_name"], "books_instance": self.instance},
                 "document_name",
@@ -433,6 +467,11 @@ class PaymentEntry(DocConverterBase):
 
 
 class StockEntry(DocConverterBase):
+    erpn_extra_fields = ("docstatus",)
+    erpn_extra_child_fields = {
+        "items": ["use_serial_batch_fields", "serial_and_batch_bundle"]
+    }
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             # "naming_series": "numberSeries",
@@ -531,6 +570,8 @@ class PriceList(DocConverterBase):
 
 
 class ItemPrice(DocConverterBase):
+    fbooks_key_fields = ("parentSchemaName", "parentFieldname", "parent")
+
     def __init__(self, instance, dirty_doc, target):
         self.field_map = {
             "name": "name",
@@ -613,7 +654,7 @@ class DeliveryNote(DocConverterBase):
         if self.doc_dict.get("backReference"):
             for row in self.converted_doc["items"]:
                 try:
-                    reference_name_in_erpn = frappe.db.get_value(
+                    reference_name_in_erpn = get_memoized_value(
                         "Books Reference",
                         {"books_name": self.doc_dict.get("backReference"), "books_instance": self.instance},
                         "document_name",
@@ -0,0 +1,98 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.model import child_table_fields, default_fields, table_fields
+from frappe.utils import create_batch
+from books_integration.doc_converter import init_doc_converter
+
+
+LOAD_BATCH_SIZE = 500
+
+
+def load_source_docs(queued_docs):
+    """Returns the queued documents by (doctype, name) and the missing rows."""
+    names_by_doctype = {}
+    for queued_doc in queued_docs:
+        names_by_doctype.setdefault(queued_doc.document_type, set()).add(
+            queued_doc.document_name
+        )
+
+    docs = {}
+    loaded_doctypes = set()
+    for doctype, names in names_by_doctype.items():
+        source_fields = get_source_fields(doctype)
+        if not source_fields:
+            continue
+
+        loaded_doctypes.add(doctype)
+        for batch in create_batch(list(names), LOAD_BATCH_SIZE):
+            for doc in get_projected_docs(doctype, batch, *source_fields):
+                docs[(doctype, doc.name)] = doc
+
+    missing = [
+        queued_doc
+        for queued_doc in queued_docs
+        if queued_doc.document_type in loaded_doctypes
+        and (queued_doc.document_type, queued_doc.document_name) not in docs
+    ]
+
+    return docs, missing
+
+
+def get_source_fields(doctype):
+    converter = init_doc_converter(None, frappe._dict(doctype=doctype), "fbooks")
+    if not converter:
+        return
+
+    return converter.get_source_fields()
+
+
+def get_projected_docs(doctype, names, fields, child_fields):
+    meta = frappe.get_meta(doctype)
+    docs = frappe.get_all(
+        doctype,
+        filters={"name": ("in", names)},
+        fields=get_valid_fields(meta, ["name", *fields]),
+    )
+
+    docs_by_name = {}
+    for doc in docs:
+        doc.doctype = doctype
+        docs_by_name[doc.name] = doc
+
+    if not docs_by_name:
+        return []
+
+    for fieldname, row_fields in child_fields.items():
+        df = meta.get_field(fieldname)
+        if not df or df.fieldtype not in table_fields:
+            continue
+
+        for doc in docs:
+            doc[fieldname] = []
+
+        rows = frappe.get_all(
+            df.options,
+            filters={
+                "parent": ("in", list(docs_by_name)),
+                "parenttype": doctype,
+                "parentfield": fieldname,
+            },
+            fields=get_valid_fields(frappe.get_meta(df.options), ["parent", *row_fields]),
+            order_by="idx asc",
+        )
+        for row in rows:
+            docs_by_name[row.parent][fieldname].append(row)
+
+    return docs
+
+
+def get_valid_fields(meta, fields):
+    return [
+        field
+        for field in dict.fromkeys(fields)
+        if field in default_fields
+        or field in child_table_fields
+        or meta.has_field(field)
+    ]
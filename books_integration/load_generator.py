@@ -0,0 +1,325 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import random
+import statistics
+import time
+
+import frappe
+from frappe.utils import now_datetime
+from books_integration.api import register_instance
+from books_integration.api.sync import get_pending_docs, sync_transactions, update_status
+from books_integration.scheduler import claim_logs, process_logs
+
+
+def run_load_test(
+    instances=5,
+    duration=60,
+    push_rate=0.5,
+    records=10,
+    payment_ratio=0.5,
+    items_per_invoice=5,
+    poll_rate=0.2,
+    pull_limit=100,
+    tick=1.0,
+    drain=False,
+    prefix="loadtest",
+    pos_profile=None,
+    echo=print,
+):
+    """Simulates Books instances syncing with the site and returns the figures."""
+    names = register_instances(instances, prefix, pos_profile)
+    payload = frappe._dict(
+        run_id=frappe.generate_hash(length=6),
+        records=records,
+        payment_ratio=payment_ratio,
+        items_per_invoice=items_per_invoice,
+        items=frappe.get_all(
+            "Item", filters={"disabled": 0, "is_sales_item": 1}, pluck="name", limit=50
+        ) or ["Load Test Item"],
+        customers=frappe.get_all(
+            "Customer", filters={"disabled": 0}, pluck="name", limit=50
+        ) or ["Load Test Customer"],
+        currency=frappe.db.get_default("currency") or "INR",
+    )
+    clients = [
+        frappe._dict(
+            instance=name,
+            sequence=0,
+            pushes_due=0.0,
+            polls_due=0.0,
+            invoices=[],
+        )
+        for name in names
+    ]
+    stats = frappe._dict(
+        push_latencies=[],
+        pull_latencies=[],
+        pushed=0,
+        duplicates=0,
+        pulled=0,
+        acknowledged=0,
+        processed=0,
+        processing_time=0.0,
+        backlog=[],
+    )
+
+    frappe.flags.books_inline_processing = True
+    try:
+        start = time.monotonic()
+        last_tick = start
+        while time.monotonic() - start < duration:
+            tick_start = time.monotonic()
+            elapsed = tick_start - last_tick
+            last_tick = tick_start
+
+            for client in clients:
+                client.pushes_due += push_rate * elapsed
+                while client.pushes_due >= 1:
+                    client.pushes_due -= 1
+                    push(client, stats, payload)
+
+                client.polls_due += poll_rate * elapsed
+                while client.polls_due >= 1:
+                    client.polls_due -= 1
+                    pull(client, stats, pull_limit)
+
+            remaining = tick - (time.monotonic() - tick_start)
+            if remaining > 0:
+                process_backlog(names, stats, remaining)
+
+            stats.backlog.append(
+                (time.monotonic() - start, get_backlog(names))
+            )
+
+        wall_time = time.monotonic() - start
+        drain_time = None
+        if drain:
+            drain_start = time.monotonic()
+            process_backlog(names, stats)
+            drain_time = time.monotonic() - drain_start
+    finally:
+        frappe.flags.books_inline_processing = False
+
+    report = get_report(names, stats, wall_time, drain_time)
+    print_report(report, echo)
+    return report
+
+
+def register_instances(count, prefix, pos_profile=None):
+    names = []
+    for index in range(count):
+        name = f"{prefix}-{index + 1:03d}"
+        register_instance(name, f"Load Test {index + 1}")
+        if pos_profile:
+            frappe.db.set_value("Books Instance", name, "pos_profile", pos_profile)
+        names.append(name)
+
+    frappe.db.commit()
+    return names
+
+
+def push(client, stats, payload):
+    records = []
+    for _ in range(payload.records):
+        client.sequence += 1
+        if client.invoices and random.random() < payload.payment_ratio:
+            records.append(make_payment(client, payload, client.invoices.pop()))
+            continue
+
+        invoice = make_invoice(client, payload)
+        client.invoices.append(invoice)
+        records.append(invoice)
+
+    start = time.monotonic()
+    response = sync_transactions(client.instance, records)
+    frappe.db.commit()
+    stats.push_latencies.append(time.monotonic() - start)
+
+    stats.pushed += len(records)
+    stats.duplicates += len(response.get("duplicates") or [])
+
+
+def pull(client, stats, limit):
+    start = time.monotonic()
+    response = get_pending_docs(client.instance, limit=limit)
+    frappe.db.commit()
+
+    docs = response.get("data") or []
+    for doc in docs:
+        update_status(
+            client.instance,
+            {
+                "books_sync_id": doc.get("books_sync_id"),
+                "doctype": doc.get("doctype"),
+                "nameInERPNext": doc.get("name"),
+                "nameInFBooks": doc.get("fbooksDocName") or doc.get("name"),
+            },
+        )
+        frappe.db.commit()
+
+    stats.pull_latencies.append(time.monotonic() - start)
+    stats.pulled += len(docs)
+    stats.acknowledged += len(docs)
+
+
+def process_backlog(instances, stats, seconds=None):
+    start = time.monotonic()
+    while seconds is None or time.monotonic() - start < seconds:
+        logs = claim_logs(instances)
+        if not logs:
+            break
+
+        stats.processed += process_logs(logs)
+        frappe.db.commit()
+
+    stats.processing_time += time.monotonic() - start
+
+
+def make_invoice(client, payload):
+    rows = []
+    for _ in range(random.randint(1, payload.items_per_invoice)):
+        quantity = random.randint(1, 5)
+        rate = round(random.uniform(10, 500), 2)
+        rows.append(
+            {
+                "item": random.choice(payload.items),
+                "quantity": quantity,
+                "unit": "Nos",
+                "unitConversionFactor": 1,
+                "rate": rate,
+                "amount": round(quantity * rate, 2),
+                "itemDiscountPercent": 0,
+                "itemDiscountAmount": 0,
+            }
+        )
+
+    total = round(sum(row["amount"] for row in rows), 2)
+    return {
+        "doctype": "SalesInvoice",
+        "name": f"{client.instance}-{payload.run_id}-SINV-{client.sequence:06d}",
+        "party": random.choice(payload.customers),
+        "date": now_datetime().isoformat(),
+        "isReturn": False,
+        "netTotal": total,
+        "baseGrandTotal": total,
+        "grandTotal": total,
+        "currency": payload.currency,
+        "exchangeRate": 1,
+        "outstandingAmount": 0,
+        "submitted": True,
+        "cancelled": False,
+        "items": rows,
+    }
+
+
+def make_payment(client, payload, invoice):
+    return {
+        "doctype": "Payment",
+        "name": f"{client.instance}-{payload.run_id}-PAY-{client.sequence:06d}",
+        "date": now_datetime().isoformat(),
+        "paymentType": "Receive",
+        "paymentMethod": "Cash",
+        "party": invoice["party"],
+        "amount": invoice["grandTotal"],
+        "submitted": True,
+        "cancelled": False,
+        "for": [
+            {
+                "referenceType": "SalesInvoice",
+                "referenceName": invoice["name"],
+                "amount": invoice["grandTotal"],
+            }
+        ],
+    }
+
+
+def get_backlog(instances):
+    backlog = frappe.get_all(
+        "Books Integration Log",
+        filters={"books_instance": ("in", instances), "processed": 0},
+        fields=["count(name) as logs", "sum(record_count) as records"],
+    )[0]
+    return frappe._dict(logs=backlog.logs or 0, records=backlog.records or 0)
+
+
+def get_report(instances, stats, wall_time, drain_time):
+    errors = frappe.db.count("Books Error Log", {"books_instance": ("in", instances)})
+    delays = [
+        (log.processed_on - log.sync_time).total_seconds()
+        for log in frappe.get_all(
+            "Books Integration Log",
+            filters={
+                "books_instance": ("in", instances),
+                "processed": 1,
+                "processed_on": ("is", "set"),
+            },
+            fields=["sync_time", "processed_on"],
+        )
+        if log.sync_time
+    ]
+
+    first_backlog = stats.backlog[0][1].records if stats.backlog else 0
+    last_backlog = stats.backlog[-1][1].records if stats.backlog else 0
+    return frappe._dict(
+        instances=len(instances),
+        wall_time=wall_time,
+        pushed=stats.pushed,
+        duplicates=stats.duplicates,
+        pulled=stats.pulled,
+        acknowledged=stats.acknowledged,
+        processed=stats.processed,
+        errors=errors,
+        push_latency=get_percentiles(stats.push_latencies),
+        pull_latency=get_percentiles(stats.pull_latencies),
+        processing_delay=get_percentiles(delays),
+        ingest_rate=stats.pushed / wall_time if wall_time else 0,
+        processing_rate=(
+            stats.processed / stats.processing_time if stats.processing_time else 0
+        ),
+        backlog_records=last_backlog,
+        max_backlog_records=max(
+            (backlog.records for _, backlog in stats.backlog), default=0
+        ),
+        backlog_growth=(last_backlog - first_backlog) / wall_time if wall_time else 0,
+        drain_time=drain_time,
+    )
+
+
+def get_percentiles(values):
+    if not values:
+        return frappe._dict(p50=0, p95=0, max=0)
+
+    values = sorted(values)
+    return frappe._dict(
+        p50=statistics.median(values),
+        p95=values[min(len(values) - 1, int(len(values) * 0.95))],
+        max=values[-1],
+    )
+
+
+def print_report(report, echo=print):
+    echo(f"\n{report.instances} instances for {report.wall_time:.0f}s")
+    echo(
+        f"records pushed {report.pushed} ({report.ingest_rate:.1f}/s), "
+        f"duplicates {report.duplicates}, processed {report.processed}, "
+        f"errors {report.errors}"
+    )
+    echo(f"documents pulled {report.pulled}, acknowledged {report.acknowledged}")
+    for label, values in (
+        ("push latency", report.push_latency),
+        ("pull latency", report.pull_latency),
+        ("push to processed", report.processing_delay),
+    ):
+        echo(
+            f"{label:<18} p50 {values.p50 * 1000:8.1f}ms  "
+            f"p95 {values.p95 * 1000:8.1f}ms  max {values.max * 1000:8.1f}ms"
+        )
+
+    echo(f"processing throughput {report.processing_rate:.1f} records/s")
+    echo(
+        f"backlog {report.backlog_records} records (max {report.max_backlog_records}), "
+        f"growing {report.backlog_growth:.1f} records/s"
+    )
+    if report.drain_time is not None:
+        echo(f"backlog drained in {report.drain_time:.1f}s")
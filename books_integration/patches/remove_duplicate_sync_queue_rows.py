@@ -0,0 +1,25 @@
+import frappe
+from frappe.query_builder.functions import Count
+
+
+def execute():
+    """Removes duplicate rows before the unique index is added."""
+    if not frappe.db.table_exists("Books Sync Queue"):
+        return
+
+    queue = frappe.qb.DocType("Books Sync Queue")
+    duplicates = (
+        frappe.qb.from_(queue)
+        .select(queue.document_type, queue.document_name, queue.books_instance)
+        .groupby(queue.document_type, queue.document_name, queue.books_instance)
+        .having(Count("*") > 1)
+    ).run(as_dict=True)
+
+    for duplicate in duplicates:
+        names = frappe.get_all(
+            "Books Sync Queue",
+            filters=duplicate,
+            order_by="creation asc",
+            pluck="name",
+        )
+        frappe.db.delete("Books Sync Queue", {"name": ("in", names[1:])})
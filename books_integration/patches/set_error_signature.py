@@ -0,0 +1,22 @@
+import frappe
+from books_integration.books_integration.doctype.books_error_log.books_error_log import (
+    get_error_signature,
+)
+
+
+def execute():
+    error_logs = frappe.get_all(
+        "Books Error Log",
+        filters={"error_signature": ("is", "not set")},
+        fields=["name", "error"],
+    )
+
+    for start in range(0, len(error_logs), 1000):
+        frappe.db.bulk_update(
+            "Books Error Log",
+            {
+                log.name: {"error_signature": get_error_signature(log.error)}
+                for log in error_logs[start:start + 1000]
+            },
+            update_modified=False,
+        )
@@ -0,0 +1,11 @@
+import frappe
+from frappe.query_builder.functions import Length
+
+
+def execute():
+    log = frappe.qb.DocType("Books Integration Log")
+    (
+        frappe.qb.update(log)
+        .set(log.data_size, Length(log.data))
+        .where(log.processed == 0)
+    ).run()
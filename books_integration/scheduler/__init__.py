@@ -2,71 +2,378 @@
 # For license information, please see license.txt
 
 import frappe
+import hashlib
 import json
+import time
+import zlib
+from frappe.utils import cint, now_datetime
+from books_integration.books_integration.doctype.books_ingest_receipt.books_ingest_receipt import (
+    get_receipt,
+    get_receipt_statuses,
+    set_receipt_statuses,
+)
 from books_integration.doc_converter import init_doc_converter
-from books_integration.utils import get_doctype_name, update_books_reference
+from books_integration.scheduler.bulk_insert import bulk_insert_records, can_bulk_insert
+from books_integration.scheduler.ordering import get_processing_order
+from books_integration.scheduler.timings import (
+    add_stage_timing,
+    get_stage_timings,
+    save_stage_timings,
+    stage_timer,
+    timing_scope,
+)
+from books_integration.utils import (
+    clear_memo,
+    get_converted_hash,
+    get_doctype_name,
+    update_books_reference,
+)
 
 
-def enqueue_process_transactions():
+PROCESS_JOB_ID = "BOOKS_SYNC_TRANSACTION_JOB"
+DEFAULT_PROCESS_TIME_BUDGET = 300
+# logs claimed and ordered together, a push is split into logs of at most
+# 100 records by sync_transactions
+CLAIM_WINDOW_LOGS = 5
+RECORD_SAVEPOINT = "books_record"
+BULK_INSERT_SAVEPOINT = "books_bulk_insert"
+
+
+class TransactionRolledBack(Exception):
+    """The database rolled back the whole transaction, e.g. on a deadlock."""
+
+
+def enqueue_process_transactions(partition=None, continuation=False):
+    """Enqueues the processing job of a partition, or of every partition."""
+    # the caller processes the logs itself, e.g. the books-load-test command
+    if frappe.flags.books_inline_processing:
+        return
+
+    if partition is None:
+        for partition in range(get_processing_workers()):
+            enqueue_process_transactions(partition)
+        return
+
+    # a job can not be deduplicated against itself while it runs, so a job
+    # that runs out of budget hands over under the other job id
+    job_id = f"{PROCESS_JOB_ID}::{partition}"
+    if continuation:
+        job_id = f"{job_id}::continuation"
+
     frappe.enqueue(
         "books_integration.scheduler.process_transactions",
         queue="long",
         enqueue_after_commit=True,
-        job_id="BOOKS_SYNC_TRANSACTION_JOB",
-        deduplicate=True
+        job_id=job_id,
+        deduplicate=True,
+        partition=partition,
+        continuation=continuation,
     )
 
 
-def process_transactions():
-    log = frappe.db.get_value(
-        "Books Integration Log",
-        {"processed": 0},
-        ["name", "data", "books_instance"],
-        as_dict=True
+def enqueue_instance_transactions(instance):
+    enqueue_process_transactions(get_partition(instance))
+
+
+def get_processing_workers():
+    return max(
+        cint(frappe.get_cached_doc("Books Sync Settings").processing_workers), 1
+    )
+
+
+def get_partition(instance, workers=None):
+    """Returns the processing partition of a Books Instance."""
+    return zlib.crc32(instance.encode()) % (workers or get_processing_workers())
+
+
+def process_transactions(partition=0, continuation=False):
+    """Processes the logs of a partition within the budgets of Books Sync Settings."""
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    deadline = time.monotonic() + (
+        settings.process_time_budget or DEFAULT_PROCESS_TIME_BUDGET
     )
-    if not log:
+    record_budget = settings.process_record_budget
+    processed_records = 0
+
+    workers = get_processing_workers()
+    instances = [
+        instance
+        for instance in frappe.get_all("Books Instance", pluck="name")
+        if get_partition(instance, workers) == cint(partition)
+    ]
+    if not instances:
+        return
+
+    # the job ids only deduplicate queued jobs, a job queued while another one
+    # drains the partition must not run alongside it
+    if not acquire_partition_lock(partition):
         return
 
-    frappe.db.set_value("Books Integration Log", log.name, "processed", 1)
-    data = json.loads(log.data)
+    try:
+        while True:
+            logs = claim_logs(instances)
+            if not logs:
+                break
+
+            processed_records += process_logs(logs)
+            frappe.db.commit()
+
+            if time.monotonic() >= deadline or (
+                record_budget and processed_records >= record_budget
+            ):
+                break
+    finally:
+        release_partition_lock(partition)
+        clear_memo()
+
+    # logs pushed after the last claim may have been turned away by the lock
+    if logs or has_unprocessed_logs(instances):
+        enqueue_process_transactions(partition, continuation=not continuation)
+
+
+def get_partition_lock_name(partition):
+    # named locks are shared by all databases of the server
+    return "books_process_{}_{}".format(
+        hashlib.sha1(frappe.conf.db_name.encode()).hexdigest()[:16], cint(partition)
+    )
+
+
+def acquire_partition_lock(partition):
+    """Takes the database lock of the partition without waiting."""
+    name = get_partition_lock_name(partition)
+    if frappe.db.db_type == "postgres":
+        return frappe.db.sql(
+            "select pg_try_advisory_lock(%s)", zlib.crc32(name.encode())
+        )[0][0]
+
+    return frappe.db.sql("select get_lock(%s, 0)", name)[0][0] == 1
+
+
+def release_partition_lock(partition):
+    name = get_partition_lock_name(partition)
+    if frappe.db.db_type == "postgres":
+        frappe.db.sql("select pg_advisory_unlock(%s)", zlib.crc32(name.encode()))
+    else:
+        frappe.db.sql("select release_lock(%s)", name)
+
+
+def has_unprocessed_logs(instances):
+    return frappe.db.exists(
+        "Books Integration Log",
+        {"processed": 0, "books_instance": ("in", instances)},
+    )
+
+
+def claim_logs(instances, window=CLAIM_WINDOW_LOGS):
+    """Locks the oldest unprocessed logs of instances, skipping locked ones."""
+    log_table = frappe.qb.DocType("Books Integration Log")
+    logs = (
+        frappe.qb.from_(log_table)
+        .select(log_table.name, log_table.data, log_table.books_instance)
+        .where(log_table.processed == 0)
+        .where(log_table.books_instance.isin(instances))
+        .orderby(log_table.creation)
+        .limit(window)
+        .for_update(skip_locked=True)
+    ).run(as_dict=True)
+
+    return logs
+
+
+def mark_logs_processed(logs):
+    log_table = frappe.qb.DocType("Books Integration Log")
+    (
+        frappe.qb.update(log_table)
+        .set(log_table.processed, 1)
+        .set(log_table.processed_on, now_datetime())
+        .where(log_table.name.isin([log.name for log in logs]))
+    ).run()
+
+
+def process_logs(logs):
+    """Processes the records of the claimed logs in dependency order."""
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    commit_records = cint(settings.commit_interval_records)
+    commit_seconds = cint(settings.commit_interval_ms) / 1000
+
+    records = [
+        (log, record, get_receipt(log.books_instance, record))
+        for log in logs
+        for record in json.loads(log.data)
+    ]
+    existing_receipts = get_receipt_statuses(
+        [receipt.name for _, _, receipt in records]
+    )
+    processed = set()
+    statuses = {}
+    bulk_records = []
+    timings = get_stage_timings()
+    uncommitted = 0
+    last_commit = time.monotonic()
+
     frappe.flags.in_books_process = True
-    for record in data:
-        try:
+    try:
+        for index in get_processing_order(
+            [(log.books_instance, record) for log, record, _ in records]
+        ):
+            log, record, receipt = records[index]
+            if is_duplicate(log.name, receipt, existing_receipts, processed):
+                continue
+
+            processed.add(receipt.name)
             doctype = get_doctype_name(record.get("doctype"), "erpn")
+            if can_bulk_insert(doctype):
+                bulk_records.append((log, record, receipt, doctype))
+                continue
+
+            # records of other doctypes may reference the pending bulk records
+            uncommitted += insert_bulk_records(bulk_records, statuses, timings)
+            process_record(log, record, receipt, doctype, statuses, timings)
+
+            uncommitted += 1
+            if (commit_records and uncommitted >= commit_records) or (
+                commit_seconds and time.monotonic() - last_commit >= commit_seconds
+            ):
+                save_receipt_statuses(statuses, existing_receipts)
+                frappe.db.commit()
+                uncommitted = 0
+                last_commit = time.monotonic()
+
+        insert_bulk_records(bulk_records, statuses, timings)
+    except TransactionRolledBack:
+        # the logs stay unprocessed, the next claim resumes them after the
+        # records committed so far
+        clear_memo()
+        frappe.log_error(
+            title="Books transactions rolled back",
+            message=frappe.get_traceback(),
+            reference_doctype="Books Integration Log",
+            reference_name=logs[0].name,
+        )
+        return len(records)
+    finally:
+        frappe.flags.in_books_process = False
+
+    save_receipt_statuses(statuses, existing_receipts)
+    save_stage_timings(timings)
+    # a window that dies before this is resumed, receipts skip settled records
+    mark_logs_processed(logs)
+
+    return len(records)
+
+
+def rollback_savepoint(save_point):
+    try:
+        frappe.db.rollback(save_point=save_point)
+    except Exception:
+        # the savepoint went with the transaction
+        frappe.db.rollback()
+        raise TransactionRolledBack
+
+
+def process_record(log, record, receipt, doctype, statuses, timings=None):
+    try:
+        frappe.db.savepoint(RECORD_SAVEPOINT)
+        with timing_scope(timings, log.name):
             process_data(log.books_instance, record, doctype)
-        except Exception:
-            frappe.get_doc({
-                "doctype": "Books Error Log",
-                "error": frappe.get_traceback(),
-                "data": record,
-                "document_type": doctype,
-                "books_instance": log.books_instance,
-                "books_integration_log": log.name
-            }).insert(ignore_permissions=True)
+        frappe.db.release_savepoint(RECORD_SAVEPOINT)
+        statuses[receipt.name] = "Processed"
+    except Exception:
+        rollback_savepoint(RECORD_SAVEPOINT)
+        # lookups memoised by the record may be gone with the rollback
+        clear_memo()
+        statuses[receipt.name] = "Failed"
+        frappe.get_doc({
+            "doctype": "Books Error Log",
+            "error": frappe.get_traceback(),
+            "data": record,
+            "document_type": doctype,
+            "books_instance": log.books_instance,
+            "books_integration_log": log.name
+        }).insert(ignore_permissions=True)
 
-    frappe.flags.in_books_process = False
-    frappe.enqueue(
-        "books_integration.scheduler.process_transactions",
-        queue="long",
-        enqueue_after_commit=True,
-        job_id="BOOKS_SYNC_TRANSACTION_JOB",
-        deduplicate=True
+
+def insert_bulk_records(bulk_records, statuses, timings=None):
+    """Bulk inserts the pending records, skipped ones go through process_record."""
+    if not bulk_records:
+        return 0
+
+    start = time.perf_counter()
+    try:
+        frappe.db.savepoint(BULK_INSERT_SAVEPOINT)
+        skipped = bulk_insert_records(
+            [(log.books_instance, record, doctype) for log, record, _, doctype in bulk_records]
+        )
+        frappe.db.release_savepoint(BULK_INSERT_SAVEPOINT)
+    except Exception:
+        rollback_savepoint(BULK_INSERT_SAVEPOINT)
+        clear_memo()
+        skipped = range(len(bulk_records))
+
+    duration = time.perf_counter() - start
+    skipped = set(skipped)
+    inserted = len(bulk_records) - len(skipped)
+    for index, (log, record, receipt, doctype) in enumerate(bulk_records):
+        if index in skipped:
+            process_record(log, record, receipt, doctype, statuses, timings)
+            continue
+
+        statuses[receipt.name] = "Processed"
+        # the time of the insert is spread evenly over the inserted records
+        if timings is not None:
+            add_stage_timing(
+                timings.setdefault(log.name, {}),
+                doctype,
+                "bulk_insert",
+                duration / inserted,
+            )
+
+    count = len(bulk_records)
+    bulk_records.clear()
+    return count
+
+
+def save_receipt_statuses(statuses, existing_receipts):
+    set_receipt_statuses(
+        {name: status for name, status in statuses.items() if name in existing_receipts}
     )
+    statuses.clear()
+
+
+def is_duplicate(log_name, receipt, existing_receipts, processed):
+    if receipt.name in processed:
+        return True
+
+    existing_receipt = existing_receipts.get(receipt.name)
+    if not existing_receipt:
+        return False
+
+    # handled by an earlier run of the log that did not finish the window
+    if existing_receipt.books_integration_log == log_name:
+        return existing_receipt.status != "Pending"
+
+    return existing_receipt.status == "Processed"
 
 
 def process_data(instance, data, doctype):
-    conv_doc = init_doc_converter(instance, data, "erpn")
-    if not conv_doc:
-        return
+    with stage_timer("convert", doctype):
+        conv_doc = init_doc_converter(instance, data, "erpn")
+        if not conv_doc:
+            return
 
-    ref_exists = frappe.db.get_value(
-        "Books Reference",
-        {
-            "document_type": doctype,
-            "books_name": data.get("name"),
-        },
-        "document_name"
-    )
+        converted_doc = conv_doc.get_converted_doc()
+        payload_hash = get_converted_hash(converted_doc, data)
+
+    with stage_timer("reference_lookup", doctype):
+        ref_exists = frappe.db.get_value(
+            "Books Reference",
+            {
+                "document_type": doctype,
+                "books_name": data.get("name"),
+            },
+            ["name", "document_name", "payload_hash"],
+            as_dict=True
+        )
 
     if not ref_exists:
         create_record(
@@ -75,45 +382,63 @@ def process_data(instance, data, doctype):
             data.get("submitted"),
             data.get("cancelled"),
             data.get("doctype"),
-            instance
+            instance,
+            payload_hash
         )
         return
 
-    _doc = frappe.get_doc(doctype, ref_exists)
-    _doc.update(conv_doc.get_converted_doc())
-    _doc.flags.ignore_permissions = True
-    _doc.save()
+    # Books re-sent the record as it was last applied
+    if ref_exists.payload_hash == payload_hash:
+        return
+
+    with stage_timer("save", doctype):
+        _doc = frappe.get_doc(doctype, ref_exists.document_name)
+        _doc.update(converted_doc)
+        _doc.flags.ignore_permissions = True
+        _doc.save()
 
     if (
         data.get("submitted")
         and _doc.meta.is_submittable
     ):
-        _doc.submit()
+        with stage_timer("submit", doctype):
+            _doc.submit()
 
     if (
         data.get("cancelled")
         and _doc.docstatus == 1
     ):
-        _doc.cancel()
+        with stage_timer("cancel", doctype):
+            _doc.cancel()
+
+    with stage_timer("update_reference", doctype):
+        frappe.db.set_value(
+            "Books Reference", ref_exists.name, "payload_hash", payload_hash
+        )
 
 
 def create_record(
-    _doc, ref, submit, cancel, doctype, instance
+    _doc, ref, submit, cancel, doctype, instance, payload_hash=None
 ):
-    doc = _doc.get_frappe_doc()
-    doc.flags.ignore_permissions = True
-    doc.run_method("set_missing_values")
-    doc.insert()
+    with stage_timer("insert", _doc.converted_doc.get("doctype")):
+        doc = _doc.get_frappe_doc()
+        doc.flags.ignore_permissions = True
+        doc.run_method("set_missing_values")
+        doc.insert()
 
     if submit and doc.meta.is_submittable:
-        doc.submit()
+        with stage_timer("submit", doc.doctype):
+            doc.submit()
 
     if cancel and doc.docstatus == 1:
-        doc.cancel()
+        with stage_timer("cancel", doc.doctype):
+            doc.cancel()
 
     reference = {
         "doctype": doctype,
         "name": doc.name,
-        "books_name": ref
+        "books_name": ref,
+        "payload_hash": payload_hash
     }
-    update_books_reference(instance, reference)
+    with stage_timer("update_reference", doc.doctype):
+        update_books_reference(instance, reference)
@@ -0,0 +1,162 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+from frappe.utils import now
+from books_integration.doc_converter import init_doc_converter
+from books_integration.utils import bulk_insert_docs, get_converted_hash
+
+
+# master doctypes whose controllers only name and validate the document,
+# Item Price stays on the full lifecycle as its validate fills in the price
+# list and item details, Batch and Serial No as theirs check the item and
+# warehouse
+BULK_INSERT_DOCTYPES = ("UOM", "Address")
+
+
+def can_bulk_insert(doctype):
+    """Whether new records of doctype can skip their controller and doc events."""
+    if not frappe.get_cached_doc("Books Sync Settings").bulk_insert_masters:
+        return False
+
+    if doctype not in BULK_INSERT_DOCTYPES:
+        return False
+
+    # on_update is skipped too, this app's own hook only queues the document
+    # back to Books, which records from Books never are
+    doc_hooks = frappe.get_doc_hooks()
+    return not any(
+        not method.startswith("books_integration.")
+        for hooked_doctype in (doctype, "*")
+        for methods in doc_hooks.get(hooked_doctype, {}).values()
+        for method in methods
+    )
+
+
+def bulk_insert_records(records):
+    """Inserts new records and returns the indexes of the ones it skipped."""
+    existing_refs = get_existing_references(records)
+
+    docs = []
+    skipped = []
+    names = set()
+    for index, (instance, record, doctype) in enumerate(records):
+        if (doctype, record.get("name"), instance) in existing_refs:
+            skipped.append(index)
+            continue
+
+        try:
+            doc, payload_hash = get_validated_doc(instance, record)
+        except Exception:
+            skipped.append(index)
+            continue
+
+        if (doc.doctype, doc.name) in names:
+            skipped.append(index)
+            continue
+
+        names.add((doc.doctype, doc.name))
+        docs.append((index, instance, record, doc, payload_hash))
+
+    docs, duplicates = remove_existing_docs(docs)
+    skipped.extend(duplicates)
+    if not docs:
+        return sorted(skipped)
+
+    rows_by_doctype = {}
+    for _, _, _, doc, _ in docs:
+        for row in (doc, *doc.get_all_children()):
+            rows_by_doctype.setdefault(row.doctype, []).append(
+                row.get_valid_dict(convert_dates_to_str=True)
+            )
+
+    for doctype, rows in rows_by_doctype.items():
+        bulk_insert_docs(doctype, rows)
+
+    bulk_insert_docs(
+        "Books Reference",
+        [
+            {
+                "document_type": doc.doctype,
+                "document_name": doc.name,
+                "books_instance": instance,
+                "books_name": record.get("name"),
+                "payload_hash": payload_hash,
+            }
+            for _, instance, record, doc, payload_hash in docs
+        ],
+    )
+
+    return sorted(skipped)
+
+
+def get_validated_doc(instance, record):
+    conv_doc = init_doc_converter(instance, record, "erpn")
+    converted_doc = conv_doc.get_converted_doc()
+    payload_hash = get_converted_hash(converted_doc, record)
+    doc = frappe.get_doc(converted_doc)
+    doc.flags.ignore_permissions = True
+
+    timestamp = now()
+    doc.owner = doc.modified_by = frappe.session.user
+    doc.creation = doc.modified = timestamp
+    doc.docstatus = 0
+
+    doc._set_defaults()
+    doc.set_new_name()
+    doc.set_parent_in_children()
+    for child in doc.get_all_children():
+        child.owner = child.modified_by = doc.owner
+        child.creation = child.modified = timestamp
+
+    # links are checked and their fetch_from values set like on insert
+    doc._action = "save"
+    doc._validate_links()
+    doc._validate_selects()
+    doc._validate_mandatory()
+    doc._validate_length()
+    return doc, payload_hash
+
+
+def get_existing_references(records):
+    if not records:
+        return set()
+
+    references = frappe.get_all(
+        "Books Reference",
+        filters={
+            "document_type": ("in", list({doctype for _, _, doctype in records})),
+            "books_name": ("in", list({record.get("name") for _, record, _ in records})),
+        },
+        fields=["document_type", "books_name", "books_instance"],
+    )
+
+    return {
+        (ref.document_type, ref.books_name, ref.books_instance) for ref in references
+    }
+
+
+def remove_existing_docs(docs):
+    names_by_doctype = {}
+    for _, _, _, doc, _ in docs:
+        names_by_doctype.setdefault(doc.doctype, []).append(doc.name)
+
+    existing = set()
+    for doctype, names in names_by_doctype.items():
+        existing.update(
+            (doctype, name)
+            for name in frappe.get_all(
+                doctype, filters={"name": ("in", names)}, pluck="name"
+            )
+        )
+
+    new_docs = []
+    duplicates = []
+    for entry in docs:
+        doc = entry[3]
+        if (doc.doctype, doc.name) in existing:
+            duplicates.append(entry[0])
+        else:
+            new_docs.append(entry)
+
+    return new_docs, duplicates
@@ -0,0 +1,144 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import bisect
+import heapq
+
+
+# Books doctypes in the order their records have to exist in ERPNext
+DOCTYPE_ORDER = [
+    "Address",
+    "Customer",
+    "Supplier",
+    "Party",
+    "UOM",
+    "Item",
+    "Batch",
+    "SerialNumber",
+    "PriceList",
+    "PriceListItem",
+    "SalesInvoice",
+    "Shipment",
+    "Payment",
+    "StockMovement",
+]
+
+# Books pushes parties as Customer or Supplier records
+PARTY_DOCTYPES = ("Customer", "Supplier", "Party")
+
+# fields (child table rows as "table.field") holding the Books name of a
+# record the converters resolve through Books Reference, and the doctypes
+# the record may have
+REFERENCE_FIELDS = {
+    "Customer": [("address", "Address")],
+    "Supplier": [("address", "Address")],
+    "Party": [("address", "Address")],
+    "Item": [("unit", "UOM"), ("uomConversions.uom", "UOM")],
+    "Batch": [("item", "Item")],
+    "SerialNumber": [("item", "Item")],
+    "PriceListItem": [("parent", "PriceList"), ("item", "Item"), ("unit", "UOM")],
+    "SalesInvoice": [
+        ("party", PARTY_DOCTYPES),
+        ("priceList", "PriceList"),
+        ("returnAgainst", "SalesInvoice"),
+        ("items.item", "Item"),
+        ("items.batch", "Batch"),
+    ],
+    "Shipment": [
+        ("party", PARTY_DOCTYPES),
+        ("backReference", "SalesInvoice"),
+        ("items.item", "Item"),
+    ],
+    "Payment": [("party", PARTY_DOCTYPES), ("for.referenceName", "SalesInvoice")],
+    "StockMovement": [("items.item", "Item")],
+}
+
+
+def get_processing_order(records):
+    """Returns the indexes of records in the order they should be processed."""
+    ranks = [get_rank(record) for _, record in records]
+
+    versions = {}
+    dependents = [[] for _ in records]
+    pending = [0] * len(records)
+
+    for index, (instance, record) in enumerate(records):
+        key = (instance, record.get("doctype"), record.get("name"))
+        if key in versions:
+            # later versions of a record stay after the earlier ones
+            add_dependency(versions[key][-1], index, dependents, pending)
+
+        versions.setdefault(key, []).append(index)
+
+    for index, (instance, record) in enumerate(records):
+        for doctype, name in get_references(record):
+            indexes = versions.get((instance, doctype, name))
+            if not indexes or index in indexes:
+                continue
+
+            # e.g. a payment arriving between an invoice and its cancellation
+            # is processed after the invoice and before the cancellation
+            position = max(bisect.bisect_left(indexes, index) - 1, 0)
+            add_dependency(indexes[position], index, dependents, pending)
+            if position + 1 < len(indexes):
+                add_dependency(index, indexes[position + 1], dependents, pending)
+
+    ready = [(ranks[index], index) for index in range(len(records)) if not pending[index]]
+    heapq.heapify(ready)
+    order = []
+    done = [False] * len(records)
+
+    while len(order) < len(records):
+        if not ready:
+            index = min(
+                (index for index in range(len(records)) if not done[index]),
+                key=lambda index: (ranks[index], index),
+            )
+            pending[index] = 0
+            ready.append((ranks[index], index))
+
+        _, index = heapq.heappop(ready)
+        if done[index]:
+            continue
+
+        done[index] = True
+        order.append(index)
+        for dependent in dependents[index]:
+            pending[dependent] -= 1
+            if pending[dependent] == 0 and not done[dependent]:
+                heapq.heappush(ready, (ranks[dependent], dependent))
+
+    return order
+
+
+def add_dependency(dependency, dependent, dependents, pending):
+    dependents[dependency].append(dependent)
+    pending[dependent] += 1
+
+
+def get_rank(record):
+    doctype = record.get("doctype")
+    if doctype in DOCTYPE_ORDER:
+        return DOCTYPE_ORDER.index(doctype)
+
+    return len(DOCTYPE_ORDER)
+
+
+def get_references(record):
+    for path, doctypes in REFERENCE_FIELDS.get(record.get("doctype"), []):
+        if isinstance(doctypes, str):
+            doctypes = (doctypes,)
+
+        if "." not in path:
+            names = [record.get(path)]
+        else:
+            table, field = path.split(".", 1)
+            names = [
+                row.get(field)
+                for row in record.get(table) or []
+                if isinstance(row, dict)
+            ]
+
+        for name in names:
+            if name:
+                yield from ((doctype, name) for doctype in doctypes)
@@ -0,0 +1,120 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import frappe
+import json
+from frappe import _
+from frappe.utils.background_jobs import is_job_enqueued
+from books_integration.books_integration.doctype.books_error_log.books_error_log import (
+    get_error_signature,
+)
+from books_integration.books_integration.doctype.books_ingest_receipt.books_ingest_receipt import (
+    get_receipt,
+    set_receipt_statuses,
+)
+from books_integration.scheduler import RECORD_SAVEPOINT, process_data
+from books_integration.scheduler.ordering import get_processing_order
+from books_integration.utils import clear_memo
+
+
+REPLAY_JOB_ID = "BOOKS_REPLAY_ERROR_LOGS_JOB"
+REPLAY_JOB_TIMEOUT = 4 * 60 * 60
+REPLAY_BATCH_SIZE = 100
+
+
+def enqueue_replay_error_logs(books_instance=None, document_type=None, error_signature=None):
+    """Enqueues the replay of the matching Books Error Logs, returns their count."""
+    if is_job_enqueued(REPLAY_JOB_ID):
+        frappe.throw(_("Books Error Logs are already being replayed"))
+
+    filters = {
+        field: value
+        for field, value in (
+            ("books_instance", books_instance),
+            ("document_type", document_type),
+            ("error_signature", error_signature),
+        )
+        if value
+    }
+
+    frappe.enqueue(
+        "books_integration.scheduler.replay.replay_error_logs",
+        queue="long",
+        timeout=REPLAY_JOB_TIMEOUT,
+        job_id=REPLAY_JOB_ID,
+        deduplicate=True,
+        filters=filters,
+    )
+
+    return frappe.db.count("Books Error Log", filters)
+
+
+def replay_error_logs(filters=None):
+    """Replays the matching Books Error Logs in dependency order."""
+    error_logs = frappe.get_all(
+        "Books Error Log",
+        filters=filters or {},
+        fields=["name", "books_instance", "document_type", "data"],
+        order_by="creation asc",
+    )
+    if not error_logs:
+        return
+
+    for log in error_logs:
+        if isinstance(log.data, str):
+            log.data = json.loads(log.data)
+
+    order = get_processing_order([(log.books_instance, log.data) for log in error_logs])
+    replayed = 0
+    failed = 0
+
+    frappe.flags.in_books_process = True
+    try:
+        for start in range(0, len(order), REPLAY_BATCH_SIZE):
+            batch = [error_logs[index] for index in order[start:start + REPLAY_BATCH_SIZE]]
+            batch_failed = replay_batch(batch)
+            frappe.db.commit()
+
+            failed += batch_failed
+            replayed += len(batch) - batch_failed
+            frappe.publish_progress(
+                (start + len(batch)) * 100 / len(order),
+                title=_("Replaying Books Error Logs"),
+                description=_("{0} replayed, {1} failed").format(replayed, failed),
+            )
+    finally:
+        frappe.flags.in_books_process = False
+        clear_memo()
+
+
+def replay_batch(error_logs):
+    replayed = []
+    failures = {}
+    statuses = {}
+
+    for log in error_logs:
+        try:
+            frappe.db.savepoint(RECORD_SAVEPOINT)
+            process_data(log.books_instance, log.data, log.document_type)
+            frappe.db.release_savepoint(RECORD_SAVEPOINT)
+        except Exception:
+            frappe.db.rollback(save_point=RECORD_SAVEPOINT)
+            clear_memo()
+            error = frappe.get_traceback()
+            failures[log.name] = {
+                "error": error,
+                "error_signature": get_error_signature(error),
+            }
+            continue
+
+        replayed.append(log.name)
+        statuses[get_receipt(log.books_instance, log.data).name] = "Processed"
+
+    if replayed:
+        frappe.db.delete("Books Error Log", {"name": ("in", replayed)})
+
+    if failures:
+        frappe.db.bulk_update("Books Error Log", failures)
+
+    set_receipt_statuses(statuses)
+    return len(failures)
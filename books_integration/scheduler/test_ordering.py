@@ -0,0 +1,93 @@
+# Copyright (c) 2024, Wahni IT Solutions and Contributors
+# See license.txt
+
+import unittest
+
+from books_integration.scheduler.ordering import get_processing_order
+
+
+def get_names(records):
+    return [
+        "{}:{}{}".format(
+            record["doctype"], record["name"], "-cancel" if record.get("cancelled") else ""
+        )
+        for _, record in (records[index] for index in get_processing_order(records))
+    ]
+
+
+class TestProcessingOrder(unittest.TestCase):
+    def test_referenced_records_go_first(self):
+        records = [
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "party": "P1"}),
+            ("books", {"doctype": "Party", "name": "P1"}),
+        ]
+        self.assertEqual(get_names(records), ["Party:P1", "SalesInvoice:S1"])
+
+    def test_versions_keep_arrival_order(self):
+        records = [
+            ("books", {"doctype": "SalesInvoice", "name": "S1"}),
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "cancelled": True}),
+            ("books", {"doctype": "Party", "name": "P1"}),
+        ]
+        self.assertEqual(
+            get_names(records),
+            ["Party:P1", "SalesInvoice:S1", "SalesInvoice:S1-cancel"],
+        )
+
+    def test_reference_before_record_precedes_its_later_versions(self):
+        records = [
+            ("books", {"doctype": "Payment", "name": "PAY1", "for": [{"referenceName": "S1"}]}),
+            ("books", {"doctype": "SalesInvoice", "name": "S1"}),
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "cancelled": True}),
+        ]
+        self.assertEqual(
+            get_names(records),
+            ["SalesInvoice:S1", "Payment:PAY1", "SalesInvoice:S1-cancel"],
+        )
+
+    def test_reference_follows_latest_earlier_version(self):
+        records = [
+            ("books", {"doctype": "SalesInvoice", "name": "S1"}),
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "cancelled": True}),
+            ("books", {"doctype": "Payment", "name": "PAY1", "for": [{"referenceName": "S1"}]}),
+        ]
+        self.assertEqual(
+            get_names(records),
+            ["SalesInvoice:S1", "SalesInvoice:S1-cancel", "Payment:PAY1"],
+        )
+
+    def test_customers_and_suppliers_are_parties(self):
+        records = [
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "party": "C1"}),
+            ("books", {"doctype": "Customer", "name": "C1", "address": "A1"}),
+            ("books", {"doctype": "Payment", "name": "PAY1", "party": "SUP1"}),
+            ("books", {"doctype": "Supplier", "name": "SUP1"}),
+            ("books", {"doctype": "Address", "name": "A1"}),
+        ]
+        self.assertEqual(
+            get_names(records),
+            [
+                "Address:A1",
+                "Customer:C1",
+                "Supplier:SUP1",
+                "SalesInvoice:S1",
+                "Payment:PAY1",
+            ],
+        )
+
+    def test_references_stay_within_instance(self):
+        records = [
+            ("books-a", {"doctype": "SalesInvoice", "name": "S1", "party": "P1"}),
+            ("books-b", {"doctype": "Party", "name": "P1"}),
+            ("books-b", {"doctype": "SalesInvoice", "name": "S2", "party": "P1"}),
+        ]
+        self.assertEqual(
+            get_names(records), ["Party:P1", "SalesInvoice:S1", "SalesInvoice:S2"]
+        )
+
+    def test_reference_cycles_are_broken(self):
+        records = [
+            ("books", {"doctype": "SalesInvoice", "name": "S1", "returnAgainst": "S2"}),
+            ("books", {"doctype": "SalesInvoice", "name": "S2", "returnAgainst": "S1"}),
+        ]
+        self.assertEqual(get_names(records), ["SalesInvoice:S1", "SalesInvoice:S2"])
@@ -0,0 +1,80 @@
+# Copyright (c) 2024, Wahni IT Solutions and contributors
+# For license information, please see license.txt
+
+import time
+from contextlib import contextmanager
+
+import frappe
+
+
+# upper bounds in seconds of the histogram buckets stage durations fall in
+STAGE_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+
+def get_stage_timings():
+    """Returns a dict to collect stage timings in, or None when they are off."""
+    if frappe.get_cached_doc("Books Sync Settings").record_stage_timings:
+        return {}
+
+
+@contextmanager
+def timing_scope(timings, log_name):
+    """Records the stages timed inside the block under the log."""
+    if timings is None:
+        yield
+        return
+
+    previous = getattr(frappe.local, "books_stage_timings", None)
+    frappe.local.books_stage_timings = timings.setdefault(log_name, {})
+    try:
+        yield
+    finally:
+        frappe.local.books_stage_timings = previous
+
+
+@contextmanager
+def stage_timer(stage, doctype):
+    timings = getattr(frappe.local, "books_stage_timings", None)
+    if timings is None:
+        yield
+        return
+
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        add_stage_timing(timings, doctype, stage, time.perf_counter() - start)
+
+
+def add_stage_timing(timings, doctype, stage, duration):
+    """Adds a duration to the Prometheus style histogram of a stage."""
+    histogram = timings.setdefault(doctype or "", {}).setdefault(
+        stage,
+        {
+            "count": 0,
+            "sum": 0.0,
+            "max": 0.0,
+            "buckets": {str(bound): 0 for bound in STAGE_BUCKETS},
+        },
+    )
+
+    histogram["count"] += 1
+    histogram["sum"] = round(histogram["sum"] + duration, 6)
+    histogram["max"] = round(max(histogram["max"], duration), 6)
+    for bound in STAGE_BUCKETS:
+        if duration <= bound:
+            histogram["buckets"][str(bound)] += 1
+
+
+def save_stage_timings(timings):
+    if not timings:
+        return
+
+    frappe.db.bulk_update(
+        "Books Integration Log",
+        {
+            log_name: {"stage_timings": frappe.as_json(log_timings, indent=None)}
+            for log_name, log_timings in timings.items()
+        },
+        update_modified=False,
+    )
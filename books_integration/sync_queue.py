@@ -2,6 +2,12 @@
 # For license information, please see license.txt
 
 import frappe
+from frappe.utils import create_batch
+from books_integration.utils import bulk_insert_docs, get_doctype_name
+
+
+MASTER_SYNC_PAGE_SIZE = 1000
+SYNC_INSTANCES_CACHE_KEY = "books_sync_instances"
 
 
 def add_doc_to_sync_queue(doc, method=None):
@@ -14,29 +20,96 @@ def add_doc_to_sync_queue(doc, method=None):
     if not document_should_sync(doc.doctype):
         return
 
-    instances = frappe.db.get_all(
-        "Books Instance",
-        # filters={"enable_sync": 1},
-        pluck="name",
-    )
-    for instance in instances:
-        is_exists_in_queue = frappe.db.exists(
+    # one statement for every instance, rows already queued are skipped by
+    # the unique index on document and instance
+    bulk_insert_docs(
+        "Books Sync Queue",
+        [
             {
-                "doctype": "Books Sync Queue",
-                "document_name": doc.name,
                 "document_type": doc.doctype,
+                "document_name": doc.name,
                 "books_instance": instance,
             }
-        )
-        if not is_exists_in_queue:
-            frappe.get_doc(
+            for instance in get_sync_instances()
+        ],
+        ignore_duplicates=True,
+    )
+
+
+def get_sync_instances():
+    return frappe.cache().get_value(
+        SYNC_INSTANCES_CACHE_KEY,
+        lambda: frappe.get_all("Books Instance", pluck="name"),
+    )
+
+
+def clear_sync_instances_cache():
+    frappe.cache().delete_value(SYNC_INSTANCES_CACHE_KEY)
+
+
+def enqueue_documents(instance, document_type, document_names, batch_size=1000):
+    """Queues the documents that are not already queued for instance."""
+    for batch in create_batch(list(dict.fromkeys(document_names)), batch_size):
+        # the unique index skips documents queued already or concurrently
+        bulk_insert_docs(
+            "Books Sync Queue",
+            [
                 {
-                    "doctype": "Books Sync Queue",
-                    "document_name": doc.name,
-                    "document_type": doc.doctype,
+                    "document_type": document_type,
+                    "document_name": name,
                     "books_instance": instance,
                 }
-            ).insert()
+                for name in batch
+            ],
+            ignore_duplicates=True,
+        )
+
+
+def get_master_sync_doctypes(doctypes=None):
+    """Returns the ERPNext doctypes synced to Books, limited to doctypes if given."""
+    settings = frappe.get_cached_doc("Books Sync Settings")
+    synced_doctypes = [
+        row.document_type
+        for row in settings.sync_docs
+        if row.sync_type in ("ERPNext to Books", "Two Way")
+    ]
+
+    if not doctypes:
+        return synced_doctypes
+
+    requested = {get_doctype_name(doctype, "erpn") or doctype for doctype in doctypes}
+    return [doctype for doctype in synced_doctypes if doctype in requested]
+
+
+def enqueue_all_documents(instance, doctypes):
+    """Queues every document of doctypes for instance, a page at a time."""
+    for doctype in doctypes:
+        filters = {}
+        if frappe.get_meta(doctype).is_submittable:
+            filters["docstatus"] = ("!=", 0)
+
+        last_name = None
+        while True:
+            if last_name:
+                filters["name"] = (">", last_name)
+
+            names = frappe.get_all(
+                doctype,
+                filters=filters,
+                order_by="name asc",
+                limit=MASTER_SYNC_PAGE_SIZE,
+                pluck="name",
+            )
+            if not names:
+                break
+
+            enqueue_documents(instance, doctype, names)
+            frappe.db.commit()
+
+            if len(names) < MASTER_SYNC_PAGE_SIZE:
+                break
+
+            last_name = names[-1]
 
 
 def document_should_sync(doctype):
@@ -1,6 +1,8 @@
 # Copyright (c) 2024, Wahni IT Solutions and contributors
 # For license information, please see license.txt
 
+import hashlib
+
 import frappe
 
 
@@ -53,7 +55,7 @@ def update_books_reference(instance, reference):
             "document_name": reference.get("name"),
             "books_instance": instance,
         },
-        ["books_name", "name"],
+        ["books_name", "synced_fields", "payload_hash", "name"],
         as_dict=True,
     )
 
@@ -65,21 +67,132 @@ def update_books_reference(instance, reference):
                 "document_name": reference.get("name"),
                 "books_instance": instance,
                 "books_name": reference.get("books_name"),
+                "synced_fields": reference.get("synced_fields"),
+                "payload_hash": reference.get("payload_hash"),
             },
         ).insert()
         return
 
-    if existing_ref.books_name == reference.get("books_name"):
-        return
-
+    values = {}
     if existing_ref.books_name != reference.get("books_name"):
-        frappe.db.set_value(
-            "Books Reference", existing_ref.name, "books_name", reference.get("books_name")
-        )
+        values["books_name"] = reference.get("books_name")
+
+    for field in ("synced_fields", "payload_hash"):
+        if field in reference and existing_ref.get(field) != reference.get(field):
+            values[field] = reference.get(field)
+
+    if values:
+        frappe.db.set_value("Books Reference", existing_ref.name, values)
 
     return
 
 
+def get_books_references(instance, documents):
+    """Returns the Books References of (document_type, document_name) pairs of an instance."""
+    if not documents:
+        return {}
+
+    references = frappe.get_all(
+        "Books Reference",
+        filters={
+            "books_instance": instance,
+            "document_type": ("in", list({doc[0] for doc in documents})),
+            "document_name": ("in", list({doc[1] for doc in documents})),
+        },
+        fields=["name", "document_type", "document_name", "books_name", "synced_fields"],
+    )
+
+    return {(ref.document_type, ref.document_name): ref for ref in references}
+
+
+def get_memoized_value(doctype, filters, fieldname="name", as_dict=False):
+    """frappe.db.get_value memoised until clear_memo, only found values are kept."""
+    key = (
+        "value",
+        doctype,
+        frappe.as_json(filters, indent=None),
+        frappe.as_json(fieldname, indent=None),
+        as_dict,
+    )
+    return get_memoized(
+        key, frappe.db.get_value, doctype, filters, fieldname, as_dict=as_dict
+    )
+
+
+def memoized_exists(doctype, name):
+    return get_memoized(("exists", doctype, name), frappe.db.exists, doctype, name)
+
+
+def get_memoized(key, method, *args, **kwargs):
+    memo = get_memo()
+    if key in memo:
+        return memo[key]
+
+    value = method(*args, **kwargs)
+    if value:
+        memo[key] = value
+
+    return value
+
+
+def get_memo():
+    if getattr(frappe.local, "books_memo", None) is None:
+        frappe.local.books_memo = {}
+
+    return frappe.local.books_memo
+
+
+def clear_memo():
+    frappe.local.books_memo = {}
+
+
+def get_payload_hash(obj):
+    return hashlib.sha1(frappe.as_json(obj, indent=None).encode()).hexdigest()
+
+
+def get_converted_hash(converted_doc, data):
+    """Hash of a converted Books record, including the docstatus changes it requests."""
+    return get_payload_hash(
+        [converted_doc, bool(data.get("submitted")), bool(data.get("cancelled"))]
+    )
+
+
+def get_field_hashes(doc, exclude=()):
+    return {
+        field: get_payload_hash(value)[:16]
+        for field, value in doc.items()
+        if field not in exclude
+    }
+
+
+def bulk_insert_docs(doctype, docs, ignore_duplicates=False):
+    """Inserts docs (dicts with the same keys) without running controllers."""
+    if not docs:
+        return
+
+    now = frappe.utils.now()
+    user = frappe.session.user
+    standard_values = {
+        "owner": user,
+        "modified_by": user,
+        "creation": now,
+        "modified": now,
+        "docstatus": 0,
+    }
+    fields = ["name", *standard_values]
+    fields.extend(field for field in docs[0] if field not in fields)
+
+    values = []
+    for doc in docs:
+        row = {**standard_values, **doc}
+        row["name"] = row.get("name") or frappe.generate_hash(length=10)
+        values.append([row.get(field) for field in fields])
+
+    frappe.db.bulk_insert(
+        doctype, fields, values, ignore_duplicates=ignore_duplicates
+    )
+
+
 def pretty_json(obj):
     if not obj:
         return ""